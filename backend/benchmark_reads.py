@@ -0,0 +1,133 @@
+"""
+CPU cost of serializing contract responses, validated vs trusted.
+
+"validated" is the old read path: build the Pydantic models from the
+stored document, then encode them the way FastAPI does for a
+response_model. "trusted" is the current path: encode the stored document
+straight to bytes with fastjson. No database is needed; documents are
+generated in the seed-data shape.
+
+    python benchmark_reads.py [--contracts 500] [--instalments 60] [--rounds 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import fastjson  # noqa: E402
+from server import CONTRACT_LIST_PROJECTION, Contract, ContractListItem, to_list_item  # noqa: E402
+
+
+def make_contract(i: int, instalments: int) -> dict:
+    schedule = [
+        {
+            "installment_number": n,
+            "due_date": f"2024-{(n - 1) % 12 + 1:02d}-05",
+            "amount": 12345.67,
+            "status": "paid" if n < instalments // 2 else "pending",
+            "paid_date": f"2024-{(n - 1) % 12 + 1:02d}-04" if n < instalments // 2 else None,
+        }
+        for n in range(1, instalments + 1)
+    ]
+    photo = "%064x" % random.getrandbits(256)
+    return {
+        "id": f"contract-{i}",
+        "contract_number": f"VF2024{i:05d}",
+        "contract_date": "2024-01-05",
+        "status": random.choice(["live", "seized"]),
+        "company_name": "HDFC Bank",
+        "customer": {"name": f"Customer {i}", "phone": "+91 9876543210",
+                     "address": "12 Main Street, City-560001", "photo": photo},
+        "guarantor": {"name": f"Guarantor {i}", "phone": "+91 9876501234",
+                      "address": "7 Park Avenue, City-560002", "relation": "Brother", "photo": photo},
+        "vehicle": {"make": "Tata", "model": "Nexon", "year": 2022,
+                    "registration_number": f"DL01AB{i % 10000:04d}",
+                    "vin": "MA312345678901234", "color": "White"},
+        "loan": {"loan_amount": 500000.0, "interest_rate": 10.5, "tenure_months": instalments,
+                 "emi_amount": 12345.67, "total_amount": 740740.2, "amount_paid": 370370.1,
+                 "outstanding_amount": 370370.1},
+        "payment_schedule": schedule,
+    }
+
+
+def list_view(contract: dict) -> dict:
+    """The document as CONTRACT_LIST_PROJECTION would return it"""
+    view = {}
+    for path in CONTRACT_LIST_PROJECTION:
+        if path == "_id":
+            continue
+        *parents, leaf = path.split(".")
+        source = contract
+        for part in parents:
+            source = source.get(part, {})
+        if leaf not in source:
+            continue  # e.g. arrears, which only arrears.py writes
+        target = view
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = source[leaf]
+    return view
+
+
+def validated_detail(contract: dict) -> bytes:
+    return json.dumps(jsonable_encoder(Contract(**contract))).encode()
+
+
+def trusted_detail(contract: dict) -> bytes:
+    return fastjson.dumps(contract)
+
+
+def validated_list(rows: list) -> bytes:
+    items = [ContractListItem(**to_list_item(row)) for row in rows]
+    return json.dumps(jsonable_encoder(items)).encode()
+
+
+def trusted_list(rows: list) -> bytes:
+    return fastjson.dumps([to_list_item(row) for row in rows])
+
+
+def measure(func, requests, rounds):
+    """Best per-request CPU time in microseconds over rounds"""
+    best = None
+    for _ in range(rounds):
+        started = time.process_time()
+        for request in requests:
+            func(request)
+        elapsed = (time.process_time() - started) / len(requests)
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--contracts", type=int, default=500)
+    parser.add_argument("--instalments", type=int, default=60)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    contracts = [make_contract(i, args.instalments) for i in range(args.contracts)]
+    rows = [list_view(c) for c in contracts]
+    pages = [rows[i:i + args.page_size] for i in range(0, len(rows), args.page_size)]
+
+    print(f"Encoder: {'orjson' if fastjson.ORJSON_AVAILABLE else 'json (orjson not installed)'}")
+    print(f"{'endpoint':<22}{'validated us':>14}{'trusted us':>14}{'speedup':>10}")
+    for name, validated, trusted, requests in (
+        ("GET /contracts/{id}", validated_detail, trusted_detail, contracts),
+        (f"GET /contracts ({args.page_size})", validated_list, trusted_list, pages),
+    ):
+        before = measure(validated, requests, args.rounds)
+        after = measure(trusted, requests, args.rounds)
+        print(f"{name:<22}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Response compression.
+
+Contract lists and details are large, repetitive JSON and phones often
+fetch them over slow mobile data. Responses at or above a minimum size are
+compressed with brotli when the client accepts it and the brotli package
+is installed, otherwise with gzip. Cached contract responses are compressed
+once per encoding and reused (see ResponseCache); CompressionMiddleware
+handles everything else.
+"""
+
+import gzip
+import threading
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Formats worth compressing; photos are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """{coding: q} for an Accept-Encoding header"""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class Compressor:
+    def __init__(self, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # Preferred first
+        self.encodings = (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]
+        self._lock = threading.Lock()
+        self._counts = {encoding: {"responses": 0, "bytes_in": 0, "bytes_out": 0} for encoding in self.encodings}
+        self.precompressed = 0
+        self.skipped_small = 0
+
+    def choose(self, accept_encoding: str):
+        """Best encoding the client accepts, or None for identity"""
+        accepted = parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0.0
+        for encoding in self.encodings:
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def worth_compressing(self, body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            with self._lock:
+                self.skipped_small += 1
+            return False
+        return True
+
+    def record(self, encoding: str, original: int, compressed: int, precompressed: bool = False):
+        with self._lock:
+            counts = self._counts[encoding]
+            counts["responses"] += 1
+            counts["bytes_in"] += original
+            counts["bytes_out"] += compressed
+            if precompressed:
+                self.precompressed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            encodings = {}
+            for encoding, counts in self._counts.items():
+                saved = counts["bytes_in"] - counts["bytes_out"]
+                encodings[encoding] = {
+                    **counts,
+                    "bytes_saved": saved,
+                    "ratio": round(counts["bytes_out"] / counts["bytes_in"], 4) if counts["bytes_in"] else 0.0,
+                }
+            return {
+                "minimum_size": self.minimum_size,
+                "gzip_level": self.gzip_level,
+                "brotli_quality": self.brotli_quality if BROTLI_AVAILABLE else None,
+                "encodings": encodings,
+                "bytes_saved": sum(e["bytes_saved"] for e in encodings.values()),
+                "precompressed": self.precompressed,
+                "skipped_small": self.skipped_small,
+            }
+
+
+def is_compressible(content_type: str) -> bool:
+    return (content_type or "").startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Compress complete response bodies; streamed responses pass through"""
+
+    def __init__(self, app, compressor: Compressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.compressor.choose(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body", False)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))
+                    or not self.compressor.worth_compressing(body)):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = self.compressor.compress(body, encoding)
+            self.compressor.record(encoding, len(body), len(compressed))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
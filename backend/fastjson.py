@@ -0,0 +1,33 @@
+"""
+JSON encoding for trusted read paths.
+
+Stored contracts were shaped when they were written, so reads serialize
+the documents straight to bytes instead of rebuilding Pydantic models.
+orjson does this several times faster than the standard library. The
+standard library is used when orjson is not installed.
+"""
+
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
@@ -0,0 +1,420 @@
+"""
+Contract import pipeline.
+
+Imports never write to ``contracts`` directly. They load into a staging
+collection, build its indexes, check the count, and then swap it in by
+renaming, so readers never see a half-loaded book. The replaced data is
+renamed to ``contracts_previous`` for rollback. Ledger and followup rows
+(see subresources.py) are staged, promoted and rolled back the same way
+alongside their contracts.
+
+The streaming loader parses the request body incrementally and inserts
+contracts in fixed-size batches, so memory use is bounded by one batch no
+matter how large the export is. Accepted body formats:
+
+- NDJSON, one contract per line
+- a JSON array of contracts
+- the converter's ``{"contracts": [...]}`` wrapper
+"""
+
+import json
+import logging
+import time
+from json.decoder import scanstring
+
+from pydantic import ValidationError
+
+from indexes import INDEX_SPECS, ensure_collection_indexes
+from models import Contract
+from photos import externalize_photos
+from search import search_tokens
+from subresources import SUB_RESOURCES, insert_rows, iso_date, replace_rows, split_sub_resources
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+LIVE_COLLECTION = "contracts"
+STAGING_COLLECTION = "contracts_staging"
+PREVIOUS_COLLECTION = "contracts_previous"
+
+# Every collection an import replaces, contracts last so its rows are in
+# place before a contract becomes visible
+IMPORTED_COLLECTIONS = [collection for collection, _ in SUB_RESOURCES.values()] + [LIVE_COLLECTION]
+STAGING_SUFFIX = "_staging"
+PREVIOUS_SUFFIX = "_previous"
+
+# MongoDB rejects documents over 16 MB; a buffer this large without a
+# complete object means the body is malformed
+MAX_DOCUMENT_CHARS = 16 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = " \t\r\n,"
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ImportValidationError(RuntimeError):
+    pass
+
+
+class InvalidContractError(ValueError):
+    pass
+
+
+def _describe(error: ValidationError, limit: int = 3) -> str:
+    """First few problems of a ValidationError on one line"""
+    problems = [f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()[:limit]]
+    more = error.error_count() - len(problems)
+    return "; ".join(problems) + (f" (+{more} more)" if more > 0 else "")
+
+
+def _skip(buffer: str, pos: int, chars: str = _SEPARATORS) -> int:
+    while pos < len(buffer) and buffer[pos] in chars:
+        pos += 1
+    return pos
+
+
+def _scan_members(buffer: str, pos: int):
+    """Walk the "key": value members of an object from pos.
+
+    Returns ("contracts", offset just inside its array) at the contracts
+    key, ("end", offset past the closing brace) if there is none, or None
+    when the buffer ends first.
+    """
+    while True:
+        pos = _skip(buffer, pos)
+        if pos >= len(buffer):
+            return None
+        if buffer[pos] == "}":
+            return "end", pos + 1
+        if buffer[pos] != '"':
+            raise ImportFormatError("Malformed JSON object")
+        try:
+            key, pos = scanstring(buffer, pos + 1)
+        except json.JSONDecodeError:
+            return None
+        pos = _skip(buffer, pos, " \t\r\n")
+        if pos >= len(buffer):
+            return None
+        if buffer[pos] != ":":
+            raise ImportFormatError("Malformed JSON object")
+        pos = _skip(buffer, pos + 1, " \t\r\n")
+        if pos >= len(buffer):
+            return None
+        if key == "contracts":
+            if buffer[pos] != "[":
+                raise ImportFormatError('"contracts" must be an array')
+            return "contracts", pos + 1
+        try:
+            _, pos = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            return None
+
+
+def _strip_opening(buffer: str):
+    """Drop the array / wrapper opening so only the contracts remain.
+
+    Returns (rest, is_wrapper), or None until enough of the body has
+    arrived to tell. An object with a "contracts" array under any key is
+    the converter's wrapper; any other object is the first NDJSON contract.
+    """
+    stripped = buffer.lstrip()
+    if not stripped:
+        return None
+    if stripped[0] == "[":
+        return stripped[1:], False
+    if stripped[0] != "{":
+        raise ImportFormatError("Expected NDJSON or a JSON array of contracts")
+    found = _scan_members(stripped, 1)
+    if found is None:
+        return None
+    kind, end = found
+    if kind == "contracts":
+        return stripped[end:], True
+    return stripped, False
+
+
+def _check_wrapper_end(buffer: str):
+    """The rest of the wrapper after its contracts array: "]", any other
+    members, then "}" """
+    tail = buffer.lstrip(_SEPARATORS)
+    if not tail.startswith("]"):
+        raise ImportFormatError("Body ends with an incomplete contract")
+    found = _scan_members(tail, 1)
+    if found is None or found[0] != "end" or tail[found[1]:].strip():
+        raise ImportFormatError("Malformed wrapper object after the contracts array")
+
+
+def _drain(buffer: str, documents: list) -> str:
+    """Move every complete object at the head of buffer into documents"""
+    while True:
+        buffer = buffer.lstrip(_SEPARATORS)
+        if not buffer or buffer[0] in "]}":
+            return buffer
+        try:
+            document, end = _decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            return buffer  # need more data
+        if not isinstance(document, dict):
+            raise ImportFormatError("Every contract must be a JSON object")
+        documents.append(document)
+        buffer = buffer[end:]
+
+
+async def iter_json_documents(chunks):
+    """Yield JSON objects from an async iterator of byte chunks"""
+    buffer = ""
+    pending = b""
+    opening = None
+    # Parsing restarts at the head of the buffer, so after a failed attempt
+    # it waits until the buffer has doubled: a document spread over many
+    # chunks is parsed O(log n) times instead of once per chunk
+    retry_at = 0
+
+    async for chunk in chunks:
+        # Keep incomplete UTF-8 sequences for the next chunk
+        pending += chunk
+        try:
+            buffer += pending.decode("utf-8")
+            pending = b""
+        except UnicodeDecodeError as e:
+            buffer += pending[:e.start].decode("utf-8")
+            pending = pending[e.start:]
+
+        if len(buffer) < min(retry_at, MAX_DOCUMENT_CHARS + 1):
+            continue
+
+        if opening is None:
+            opening = _strip_opening(buffer)
+            if opening is None:
+                retry_at = 2 * len(buffer)
+                if len(buffer) > MAX_DOCUMENT_CHARS:
+                    raise ImportFormatError("Contract larger than 16 MB or malformed JSON")
+                continue
+            buffer = opening[0]
+
+        documents = []
+        buffer = _drain(buffer, documents)
+        retry_at = 2 * len(buffer)
+        for document in documents:
+            yield document
+        if len(buffer) > MAX_DOCUMENT_CHARS:
+            raise ImportFormatError("Contract larger than 16 MB or malformed JSON")
+
+    if pending:
+        raise ImportFormatError("Body ends with an incomplete UTF-8 sequence")
+    if not buffer.strip() and opening is None:
+        return
+    if opening is None:
+        opening = _strip_opening(buffer)
+        if opening is None:
+            raise ImportFormatError("Body ends with an incomplete contract")
+        buffer = opening[0]
+    documents = []
+    buffer = _drain(buffer, documents)
+    for document in documents:
+        yield document
+    if opening[1]:
+        _check_wrapper_end(buffer)
+    elif buffer.strip(_SEPARATORS + "]}"):
+        raise ImportFormatError("Body ends with an incomplete contract")
+
+
+class ImportProgress:
+    """Counters for the import currently running (or the last one)"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.running = False
+        self.contracts = 0
+        self.batches = 0
+        self.bytes_read = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def as_dict(self):
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "running": self.running,
+            "contracts_imported": self.contracts,
+            "batches": self.batches,
+            "bytes_read": self.bytes_read,
+            "seconds": round(elapsed, 3),
+            "contracts_per_second": round(self.contracts / elapsed, 1) if elapsed else 0.0,
+            "mb_per_second": round(self.bytes_read / elapsed / 1_000_000, 2) if elapsed else 0.0,
+            "error": self.error,
+        }
+
+
+async def prepare_contract(contract: dict, photos=None) -> dict:
+    """Validate and normalize one incoming contract; returns the document
+    to store.
+
+    Contracts that do not fit models.Contract raise InvalidContractError,
+    which fails the whole import. With a photo bucket, embedded photos are
+    moved to the photo store.
+    """
+    # Converter output keys contracts by _id (the FnCode); the API uses id
+    if 'id' not in contract and '_id' in contract:
+        contract['id'] = str(contract['_id'])
+    if photos is not None:
+        await externalize_photos(photos, contract)
+    try:
+        contract = Contract.model_validate(contract).model_dump()
+    except ValidationError as e:
+        raise InvalidContractError(f"Contract {contract.get('id')!r}: {_describe(e)}") from None
+    contract['search_tokens'] = search_tokens(contract)
+    # contract_date comes as DD-Mon-YYYY, which does not sort; sort_by=date uses this
+    contract['contract_date_iso'] = iso_date(contract.get('contract_date'))
+    return contract
+
+
+async def insert_staged(db, contracts):
+    """Insert prepared contracts into staging, their ledger and followup
+    rows into the matching staging collections"""
+    rows = [split_sub_resources(contract) for contract in contracts]
+    await insert_rows(db, rows, STAGING_SUFFIX)
+    if contracts:
+        await db[STAGING_COLLECTION].insert_many(contracts, ordered=False)
+
+
+async def apply_delta(db, contracts, deleted, photos=None):
+    """Upsert changed contracts by id and remove deleted ones.
+
+    Every contract is validated before anything is written. The result
+    includes ``contract_ids``, the ids that were upserted.
+    """
+    from pymongo import DeleteMany, ReplaceOne
+
+    operations = []
+    rows = []
+    ids = []
+    for contract in contracts:
+        contract = await prepare_contract(contract, photos)
+        rows.append(split_sub_resources(contract))
+        ids.append(contract['id'])
+        # Keep whatever _id the stored document already has
+        contract.pop('_id', None)
+        operations.append(ReplaceOne({"id": contract['id']}, contract, upsert=True))
+    deleted = [str(i) for i in deleted]
+    if deleted:
+        operations.append(DeleteMany({"id": {"$in": deleted}}))
+    if not operations:
+        return {"upserted": 0, "modified": 0, "deleted": 0, "contract_ids": []}
+
+    await replace_rows(db, ids + deleted, rows)
+    result = await db[LIVE_COLLECTION].bulk_write(operations, ordered=False)
+    return {
+        "upserted": result.upserted_count,
+        "modified": result.modified_count,
+        "deleted": result.deleted_count,
+        "contract_ids": ids,
+    }
+
+
+async def stream_import(db, chunks, batch_size=DEFAULT_BATCH_SIZE, progress=None, photos=None):
+    """Insert every contract from ``chunks`` into staging in batches.
+
+    Each batch is awaited before more of the body is read, so a slow
+    database pushes back on the client instead of buffering in memory.
+    """
+    progress = progress or ImportProgress()
+    progress.reset()
+    progress.running = True
+    progress.started_at = time.monotonic()
+
+    async def counted(source):
+        async for chunk in source:
+            progress.bytes_read += len(chunk)
+            yield chunk
+
+    batch = []
+    try:
+        async for contract in iter_json_documents(counted(chunks)):
+            batch.append(await prepare_contract(contract, photos))
+            if len(batch) >= batch_size:
+                await insert_staged(db, batch)
+                progress.contracts += len(batch)
+                progress.batches += 1
+                batch = []
+                logger.info(f"Import progress: {progress.contracts} contracts, {progress.bytes_read} bytes")
+        if batch:
+            await insert_staged(db, batch)
+            progress.contracts += len(batch)
+            progress.batches += 1
+    except Exception as e:
+        progress.error = str(e)
+        raise
+    finally:
+        progress.running = False
+        progress.finished_at = time.monotonic()
+
+    return progress.as_dict()
+
+
+async def begin_staging(db):
+    """Create empty staging collections to load the new book into"""
+    for name in IMPORTED_COLLECTIONS:
+        await db.drop_collection(name + STAGING_SUFFIX)
+        # Created up front so an empty import can still be renamed into place
+        await db.create_collection(name + STAGING_SUFFIX)
+    return db[STAGING_COLLECTION]
+
+
+async def promote_staging(db, expected_count: int):
+    """Index and validate the staging collections, then swap them in.
+
+    The live collections are renamed to ``*_previous`` (kept for
+    rollback) and the staging ones renamed into place; nothing is copied.
+    MongoDB cannot rename several collections at once, so for the few
+    milliseconds between the first and last rename readers may find no
+    contracts, but never contracts next to another book's ledger or
+    followups: contracts go aside first and come back last. If a rename
+    fails, the ones already done are undone and the old book stays live.
+    """
+    staging = db[STAGING_COLLECTION]
+    count = await staging.count_documents({})
+    if count != expected_count:
+        raise ImportValidationError(f"Staged {count} contracts, expected {expected_count}")
+
+    for name in IMPORTED_COLLECTIONS:
+        await ensure_collection_indexes(db[name + STAGING_SUFFIX], INDEX_SPECS[name])
+
+    existing = await db.list_collection_names()
+    moved_aside = []
+    promoted = []
+    try:
+        for name in reversed(IMPORTED_COLLECTIONS):
+            if name in existing:
+                await db[name].rename(name + PREVIOUS_SUFFIX, dropTarget=True)
+                moved_aside.append(name)
+        for name in IMPORTED_COLLECTIONS:
+            await db[name + STAGING_SUFFIX].rename(name)
+            promoted.append(name)
+    except Exception:
+        for name in reversed(promoted):
+            await db[name].rename(name + STAGING_SUFFIX, dropTarget=True)
+        for name in reversed(moved_aside):
+            await db[name + PREVIOUS_SUFFIX].rename(name, dropTarget=True)
+        raise
+    logger.info(f"Promoted {count} staged contracts")
+    return count
+
+
+async def rollback_import(db):
+    """Restore the book that the last import replaced"""
+    existing = await db.list_collection_names()
+    if PREVIOUS_COLLECTION not in existing:
+        raise ImportValidationError("No previous import to roll back to")
+    for name in IMPORTED_COLLECTIONS:
+        if name + PREVIOUS_SUFFIX in existing:
+            await db[name + PREVIOUS_SUFFIX].rename(name, dropTarget=True)
+            await ensure_collection_indexes(db[name], INDEX_SPECS[name])
+    return await db[LIVE_COLLECTION].count_documents({})
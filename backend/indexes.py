@@ -0,0 +1,152 @@
+"""
+Index management for the contracts, ledger, followups and users collections.
+
+Runs on app startup and can be invoked by hand:
+
+    python indexes.py            # create missing indexes, report drift
+    python indexes.py --check    # only report, change nothing
+    python indexes.py --repair   # drop and rebuild drifted indexes
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+
+def _sort_indexes(prefix):
+    """Compound indexes backing every sort_by mode of GET /api/contracts"""
+    name = "_".join(field for field, _ in prefix) + "_" if prefix else ""
+    return [
+        IndexModel(prefix + [("contract_date_iso", DESCENDING), ("id", DESCENDING)],
+                   name=f"{name}date_iso_id"),
+        IndexModel(prefix + [("customer.name", ASCENDING), ("id", ASCENDING)],
+                   name=f"{name}customer_id"),
+        IndexModel(prefix + [("loan.outstanding_amount", DESCENDING), ("id", DESCENDING)],
+                   name=f"{name}amount_id"),
+        IndexModel(prefix + [("arrears.dpd", DESCENDING), ("id", DESCENDING)],
+                   name=f"{name}dpd_id"),
+        IndexModel(prefix + [("arrears.overdue_amount", DESCENDING), ("id", DESCENDING)],
+                   name=f"{name}overdue_id"),
+    ]
+
+
+# collection -> indexes it must have; names are part of the spec so drift
+# (same name, different definition) can be detected
+INDEX_SPECS = {
+    "contracts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        *_sort_indexes([]),
+        *_sort_indexes([("status", ASCENDING)]),
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens"),
+        IndexModel([("arrears.bucket", ASCENDING), ("arrears.dpd", DESCENDING), ("id", DESCENDING)],
+                   name="bucket_dpd_id"),
+    ],
+    # Pages and date windows of one contract's rows, in either direction
+    "ledger": [
+        IndexModel([("contract_id", ASCENDING), ("date", ASCENDING), ("seq", ASCENDING)],
+                   name="contract_date_seq"),
+    ],
+    "followups": [
+        IndexModel([("contract_id", ASCENDING), ("date", ASCENDING), ("seq", ASCENDING)],
+                   name="contract_date_seq"),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+}
+
+
+def _definition(info: dict):
+    key = [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+           for field, direction in info["key"]]
+    return key, bool(info.get("unique", False))
+
+
+def _expected_definition(model: IndexModel):
+    doc = model.document
+    return list(doc["key"].items()), bool(doc.get("unique", False))
+
+
+async def ensure_collection_indexes(collection, models, check_only=False, repair=False):
+    """Create missing indexes on one collection and report drift.
+
+    Returns a dict with ``created``, ``missing``, ``ok``, ``drift`` and
+    ``unexpected`` lists of index names.
+    """
+    report = {"created": [], "missing": [], "ok": [], "drift": [], "unexpected": []}
+    existing = await collection.index_information()
+    wanted = {model.document["name"]: model for model in models}
+
+    missing = []
+    for name, model in wanted.items():
+        if name not in existing:
+            missing.append(model)
+        elif _definition(existing[name]) != _expected_definition(model):
+            report["drift"].append(name)
+            if repair and not check_only:
+                await collection.drop_index(name)
+                missing.append(model)
+        else:
+            report["ok"].append(name)
+
+    report["unexpected"] = [name for name in existing if name != "_id_" and name not in wanted]
+
+    if check_only:
+        report["missing"] = [model.document["name"] for model in missing]
+    elif missing:
+        report["created"] = await collection.create_indexes(missing)
+    return report
+
+
+async def ensure_indexes(db, check_only=False, repair=False):
+    """Bring every collection in INDEX_SPECS in line; returns a per-collection report"""
+    reports = {}
+    for collection_name, models in INDEX_SPECS.items():
+        report = await ensure_collection_indexes(db[collection_name], models, check_only, repair)
+        reports[collection_name] = report
+
+        for name in report["created"]:
+            logger.info(f"Built index {collection_name}.{name}")
+        for name in report["missing"]:
+            logger.warning(f"Missing index {collection_name}.{name}")
+        for name in report["drift"]:
+            logger.warning(f"Index drift on {collection_name}.{name}")
+        for name in report["unexpected"]:
+            logger.warning(f"Unexpected index {collection_name}.{name}")
+    return reports
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="report only, do not build anything")
+    parser.add_argument("--repair", action="store_true", help="drop and rebuild drifted indexes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    reports = asyncio.run(ensure_indexes(db, check_only=args.check, repair=args.repair))
+    client.close()
+
+    drifted = False
+    for collection_name, report in reports.items():
+        print(f"{collection_name}:")
+        for key in ("ok", "created", "missing", "drift", "unexpected"):
+            print(f"  {key:<10} {', '.join(report[key]) or '-'}")
+        drifted = drifted or bool(report["missing"] or (report["drift"] and not args.repair))
+    raise SystemExit(1 if drifted else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Contract models.
+
+prepare_contract (importer.py) validates every contract against
+``Contract`` before it is stored, and the read endpoints then serve stored
+documents as they are, so these models describe both what imports must
+send and what /api/contracts/{id} returns.
+
+Both converters' shapes are accepted. sql_to_mobile_converter.py writes
+``PaymentSchedule`` rows and a ``vin``; windows_tool/sql_converter.py
+writes ``ConverterInstalment`` rows and chassis / engine numbers. Fields a
+model does not name are kept as they are.
+"""
+
+import uuid
+from datetime import datetime
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Discriminator, Field, Tag
+from typing_extensions import Annotated
+
+
+class StoredModel(BaseModel):
+    # Keep converter fields the API does not model (father, phone2, ...)
+    model_config = ConfigDict(extra="allow")
+
+
+class Customer(StoredModel):
+    name: str
+    phone: str
+    address: str
+    photo: Optional[str] = None  # photo hash, served by /api/photos/{hash}
+
+
+class Guarantor(StoredModel):
+    name: str
+    phone: str
+    address: str
+    relation: str
+    photo: Optional[str] = None  # photo hash, served by /api/photos/{hash}
+
+
+class Vehicle(StoredModel):
+    make: str
+    model: str
+    year: int
+    registration_number: str
+    vin: Optional[str] = None
+    chassis_number: Optional[str] = None
+    engine_number: Optional[str] = None
+    color: str
+
+
+class PaymentSchedule(StoredModel):
+    installment_number: int
+    due_date: str
+    amount: float
+    status: str  # paid, pending, overdue
+    paid_date: Optional[str] = None
+
+
+class ConverterInstalment(StoredModel):
+    """A FnAgInstalments row as windows_tool/sql_converter.py exports it"""
+    sno: int
+    emi_amount: float
+    due_date: str  # DD-Mon-YYYY
+    payment_received: float = 0.0
+    date_received: str = ""
+    delay_days: int = 0
+
+
+def _instalment_shape(row) -> str:
+    """Which converter wrote a payment_schedule row"""
+    if isinstance(row, dict):
+        return "converter" if "sno" in row else "schedule"
+    return "converter" if isinstance(row, ConverterInstalment) else "schedule"
+
+
+# Validated against one model, picked by shape, rather than trying both
+Instalment = Annotated[
+    Union[Annotated[PaymentSchedule, Tag("schedule")], Annotated[ConverterInstalment, Tag("converter")]],
+    Discriminator(_instalment_shape),
+]
+
+
+class LoanDetails(StoredModel):
+    loan_amount: float
+    interest_rate: float
+    tenure_months: int
+    emi_amount: float
+    total_amount: float
+    amount_paid: float
+    outstanding_amount: float
+
+
+class Contract(StoredModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    contract_number: str
+    contract_date: str
+    status: str  # active, completed, overdue
+    company_name: str = "Vehicle Finance Ltd"
+    customer: Customer
+    guarantor: Guarantor
+    vehicle: Vehicle
+    loan: LoanDetails
+    payment_schedule: List[Instalment]
+    created_at: datetime = Field(default_factory=datetime.utcnow)
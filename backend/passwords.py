@@ -0,0 +1,110 @@
+"""
+Worker pool for bcrypt.
+
+bcrypt deliberately takes 100-300 ms per call. Run inside an async handler
+it blocks the event loop and every other request with it, so hashing and
+verification run on a small dedicated thread pool instead (bcrypt releases
+the GIL). The pool's queue is bounded, and concurrent logins are limited
+per username and per client IP so a burst of logins cannot starve the data
+endpoints.
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import bcrypt
+
+
+class LoginThrottled(Exception):
+    """Too many logins in flight for one username or client"""
+
+
+class PasswordPoolBusy(Exception):
+    """The hashing queue is full"""
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class PasswordPool:
+    def __init__(self, workers=2, max_pending=32, per_user=2, per_ip=8):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self._pending = 0
+        self._by_user = {}
+        self._by_ip = {}
+        # Recent latencies in seconds, for percentiles
+        self._login_latency = deque(maxlen=1000)
+        self._hash_latency = deque(maxlen=1000)
+        self.counts = {"success": 0, "failure": 0, "throttled": 0, "busy": 0}
+
+    async def run(self, func, *args):
+        """Run a bcrypt call on the pool; raises PasswordPoolBusy when full"""
+        if self._pending >= self.max_pending:
+            self.counts["busy"] += 1
+            raise PasswordPoolBusy()
+        self._pending += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+            self._hash_latency.append(loop.time() - started)
+
+    @asynccontextmanager
+    async def limit(self, username: str, client_ip: str):
+        """Admit one login for username from client_ip, or raise LoginThrottled"""
+        if self._by_user.get(username, 0) >= self.per_user or self._by_ip.get(client_ip, 0) >= self.per_ip:
+            self.counts["throttled"] += 1
+            raise LoginThrottled()
+        self._by_user[username] = self._by_user.get(username, 0) + 1
+        self._by_ip[client_ip] = self._by_ip.get(client_ip, 0) + 1
+        try:
+            yield
+        finally:
+            for counts, key in ((self._by_user, username), (self._by_ip, client_ip)):
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+
+    def record_login(self, seconds: float, success: bool):
+        self._login_latency.append(seconds)
+        self.counts["success" if success else "failure"] += 1
+
+    def stats(self) -> dict:
+        def summary(samples):
+            return {
+                "samples": len(samples),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+            }
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "logins": dict(self.counts),
+            "login_latency": summary(self._login_latency),
+            "bcrypt_latency": summary(self._hash_latency),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
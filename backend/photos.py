@@ -0,0 +1,167 @@
+"""
+Content-addressed photo store.
+
+Photos live once in GridFS under the sha256 of their bytes and are served
+by GET /api/photos/{hash}. Contracts carry only the hash, so a photo used
+by many contracts is stored and downloaded once, and clients can cache it
+forever.
+
+Move photos still embedded in stored contracts with:
+
+    python photos.py
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import re
+from pathlib import Path
+
+from gridfs.errors import FileExists
+from pymongo.errors import DuplicateKeyError
+
+BUCKET_NAME = "photos"
+
+# Contract fields that may hold a photo
+PHOTO_FIELDS = ["photo", "customer.photo", "guarantor.photo"]
+
+_DATA_URI = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?P<params>(;[^;,]*)*?);base64,(?P<data>.*)$", re.S)
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+def get_bucket(db):
+    from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+    return AsyncIOMotorGridFSBucket(db, bucket_name=BUCKET_NAME)
+
+
+def is_photo_hash(value) -> bool:
+    return isinstance(value, str) and bool(_HASH.match(value))
+
+
+def decode_data_uri(value):
+    """(bytes, content_type) for a base64 data URI, else None"""
+    if not isinstance(value, str):
+        return None
+    match = _DATA_URI.match(value)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(match.group("data"), validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    return data, match.group("type") or "application/octet-stream"
+
+
+async def store_photo(bucket, data: bytes, content_type: str) -> str:
+    """Store photo bytes once; returns their sha256 hex digest"""
+    photo_hash = hashlib.sha256(data).hexdigest()
+    if await bucket.find({"_id": photo_hash}, limit=1).to_list(1):
+        return photo_hash
+    try:
+        await bucket.upload_from_stream_with_id(
+            photo_hash, photo_hash, data, metadata={"content_type": content_type}
+        )
+    except (DuplicateKeyError, FileExists):
+        # Same hash, same bytes: another upload got there first. GridFS
+        # reports a clash on its unique indexes as FileExists
+        pass
+    return photo_hash
+
+
+def _holder(contract: dict, path: str):
+    """(dict holding the field, field name) for a dotted path, or (None, name)"""
+    *parents, leaf = path.split(".")
+    holder = contract
+    for part in parents:
+        holder = holder.get(part) if isinstance(holder, dict) else None
+    return (holder if isinstance(holder, dict) else None), leaf
+
+
+async def externalize_photos(bucket, contract: dict) -> dict:
+    """Replace embedded data URI photos in a contract with their hashes"""
+    for path in PHOTO_FIELDS:
+        holder, leaf = _holder(contract, path)
+        if holder is None:
+            continue
+        decoded = decode_data_uri(holder.get(leaf))
+        if decoded:
+            holder[leaf] = await store_photo(bucket, *decoded)
+    return contract
+
+
+async def open_photo(bucket, photo_hash: str):
+    """GridOut for a stored photo, or None"""
+    from gridfs.errors import NoFile
+
+    try:
+        return await bucket.open_download_stream(photo_hash)
+    except NoFile:
+        return None
+
+
+def parse_range(header: str, length: int):
+    """(start, end) inclusive for a single "bytes=" range.
+
+    Returns None when the header should be ignored and raises ValueError
+    when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                return None
+            return max(length - suffix, 0), length - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else length - 1
+    except ValueError:
+        return None
+    if start >= length or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, length - 1)
+
+
+async def migrate(db, batch_size=200):
+    """Move embedded photos of stored contracts into the photo store"""
+    from pymongo import UpdateOne
+
+    bucket = get_bucket(db)
+    projection = {field: 1 for field in PHOTO_FIELDS}
+    query = {"$or": [{field: {"$regex": "^data:"}} for field in PHOTO_FIELDS]}
+    moved = 0
+    batch = []
+    async for contract in db.contracts.find(query, projection):
+        await externalize_photos(bucket, contract)
+        update = {}
+        for field in PHOTO_FIELDS:
+            holder, leaf = _holder(contract, field)
+            if holder is not None and is_photo_hash(holder.get(leaf)):
+                update[field] = holder[leaf]
+        if update:
+            batch.append(UpdateOne({"_id": contract["_id"]}, {"$set": update}))
+        if len(batch) >= batch_size:
+            moved += (await db.contracts.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        moved += (await db.contracts.bulk_write(batch, ordered=False)).modified_count
+    return moved
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    moved = asyncio.run(migrate(db))
+    client.close()
+    print(f"Photos moved to the photo store on {moved} contracts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Materialized portfolio summary.
+
+One aggregation groups the whole book by status and company_name and
+writes the groups to ``portfolio_summary`` with $out, which replaces the
+previous summary atomically. It reruns after every import, so dashboards
+read a few dozen pre-summed rows instead of scanning every contract.
+
+Rebuild by hand with:
+
+    python portfolio.py
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+
+SUMMARY_COLLECTION = "portfolio_summary"
+SUMMARY_META_ID = "portfolio_summary"
+
+# Output name -> contract field summed per group
+SUMMED_FIELDS = {
+    "outstanding_amount": "loan.outstanding_amount",
+    "emi_amount": "loan.emi_amount",
+    "loan_amount": "loan.loan_amount",
+    "amount_paid": "loan.amount_paid",
+    "overdue_amount": "arrears.overdue_amount",
+}
+
+SUMMARY_PIPELINE = [
+    {"$group": {
+        "_id": {
+            "status": "$status",
+            # Same default as the contract list
+            "company_name": {"$ifNull": ["$company_name", "Vehicle Finance Ltd"]},
+        },
+        "contracts": {"$sum": 1},
+        **{name: {"$sum": {"$ifNull": [f"${field}", 0]}} for name, field in SUMMED_FIELDS.items()},
+    }},
+    {"$project": {
+        "_id": 0,
+        "status": "$_id.status",
+        "company_name": "$_id.company_name",
+        "contracts": 1,
+        **{name: 1 for name in SUMMED_FIELDS},
+    }},
+    {"$sort": {"status": 1, "company_name": 1}},
+    {"$out": SUMMARY_COLLECTION},
+]
+
+
+async def refresh_summary(db):
+    """Recompute the summary from contracts; returns the refresh time"""
+    await db.contracts.aggregate(SUMMARY_PIPELINE).to_list(None)
+    refreshed_at = datetime.utcnow()
+    await db.meta.replace_one(
+        {"_id": SUMMARY_META_ID}, {"_id": SUMMARY_META_ID, "refreshed_at": refreshed_at}, upsert=True
+    )
+    return refreshed_at
+
+
+def _rollup(rows, key):
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(row[key], {key: row[key], "contracts": 0, **{name: 0.0 for name in SUMMED_FIELDS}})
+        group["contracts"] += row["contracts"]
+        for name in SUMMED_FIELDS:
+            group[name] += row[name]
+    return sorted(groups.values(), key=lambda group: str(group[key]))
+
+
+def _rounded(group: dict) -> dict:
+    return {key: round(value, 2) if isinstance(value, float) else value for key, value in group.items()}
+
+
+async def load_summary(db) -> dict:
+    """Totals, per-status, per-company and per-(status, company) figures"""
+    meta = await db.meta.find_one({"_id": SUMMARY_META_ID})
+    if meta is None:
+        # First request after an upgrade: nothing materialized yet
+        refreshed_at = await refresh_summary(db)
+    else:
+        refreshed_at = meta["refreshed_at"]
+
+    rows = await db[SUMMARY_COLLECTION].find({}, {"_id": 0}).to_list(None)
+    totals = {"contracts": sum(row["contracts"] for row in rows)}
+    for name in SUMMED_FIELDS:
+        totals[name] = sum(row[name] for row in rows)
+    return {
+        "totals": _rounded(totals),
+        "by_status": [_rounded(group) for group in _rollup(rows, "status")],
+        "by_company": [_rounded(group) for group in _rollup(rows, "company_name")],
+        "by_status_company": [_rounded(row) for row in rows],
+        "refreshed_at": refreshed_at,
+    }
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    async def rebuild():
+        await refresh_summary(db)
+        return await load_summary(db)
+
+    totals = asyncio.run(rebuild())["totals"]
+    client.close()
+    print(f"Portfolio summary rebuilt: {totals['contracts']} contracts, "
+          f"{totals['outstanding_amount']:,.2f} outstanding")
+
+
+if __name__ == "__main__":
+    main()
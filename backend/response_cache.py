@@ -0,0 +1,148 @@
+"""
+Response cache for contract reads.
+
+Contract data only changes when an import runs, so serialized list and
+detail responses are cached under the current data version. Every import
+bumps the version, which makes all older entries unreachable. Each entry
+also carries an ETag so clients can revalidate and get a bodiless 304, and
+keeps its compressed bodies so each is only compressed once. The cache is
+bounded by the bytes of all those bodies, raw and compressed, so a few
+large list pages cannot take more memory than the limit.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+DATA_VERSION_ID = "data_version"
+
+
+class DataVersion:
+    """Counter in the meta collection, bumped by every import.
+
+    Reads are served from memory and refreshed from MongoDB at most every
+    refresh_interval seconds, so imports run by other workers are picked up
+    quickly without a round trip per request.
+    """
+
+    def __init__(self, collection, refresh_interval: float = 1.0):
+        self._collection = collection
+        self.refresh_interval = refresh_interval
+        self._value = None
+        self._checked_at = 0.0
+
+    async def get(self) -> int:
+        now = time.monotonic()
+        if self._value is None or now - self._checked_at >= self.refresh_interval:
+            doc = await self._collection.find_one({"_id": DATA_VERSION_ID})
+            self._value = doc["value"] if doc else 0
+            self._checked_at = now
+        return self._value
+
+    async def bump(self) -> int:
+        from pymongo import ReturnDocument
+
+        doc = await self._collection.find_one_and_update(
+            {"_id": DATA_VERSION_ID},
+            {"$inc": {"value": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._value = doc["value"]
+        self._checked_at = time.monotonic()
+        return self._value
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "headers", "size", "_encoded", "_cache")
+
+    def __init__(self, body: bytes, headers: dict):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.headers = headers
+        self.size = len(body)
+        self._encoded = {}
+        self._cache = None  # the ResponseCache holding this entry, if any
+
+    def encoded(self, encoding: str, compress) -> bytes:
+        """The body in encoding, compressed on first use and kept with the entry"""
+        if encoding not in self._encoded:
+            body = compress(self.body, encoding)
+            self._encoded[encoding] = body
+            self.size += len(body)
+            if self._cache is not None:
+                self._cache._grew(self, len(body))
+        return self._encoded[encoding]
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, body: bytes, headers: dict = None) -> CachedResponse:
+        """Cache body under key; a body over max_bytes is returned uncached"""
+        entry = CachedResponse(body, headers or {})
+        if entry.size > self.max_bytes:
+            return entry
+        self._discard(self._entries.pop(key, None))
+        self._entries[key] = entry
+        entry._cache = self
+        self.bytes += entry.size
+        self._evict()
+        return entry
+
+    def _grew(self, entry: CachedResponse, added: int):
+        self.bytes += added
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until within max_bytes"""
+        while self.bytes > self.max_bytes and self._entries:
+            self._discard(self._entries.popitem(last=False)[1])
+
+    def _discard(self, entry):
+        if entry is not None:
+            self.bytes -= entry.size
+            entry._cache = None
+
+    def clear(self):
+        for entry in self._entries.values():
+            entry._cache = None
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,151 @@
+"""
+Token index for contract search.
+
+Every contract carries a ``search_tokens`` array computed at import time:
+
+- every prefix of each word in names, make and model ("raj", "raje", ...)
+- every substring of compacted identifiers such as contract, file and
+  registration numbers ("dl12ab1234" -> "1234", "12ab", ...)
+- ``=word`` markers for whole words and identifiers, used for ranking
+
+A query matches when all of its words are in ``search_tokens``, which a
+multikey index answers without scanning the collection.
+
+Backfill existing documents with:
+
+    python search.py
+"""
+
+import asyncio
+import os
+import re
+from pathlib import Path
+
+SEARCH_TOKENS_FIELD = "search_tokens"
+SEARCH_SCORE_FIELD = "search_score"
+
+MAX_TOKEN_LENGTH = 20
+EXACT_MARKER = "="
+
+# Free text fields: matched by word prefix
+WORD_FIELDS = [
+    "customer.name",
+    "customer_name",
+    "vehicle.make",
+    "vehicle.model",
+]
+
+# Identifier fields: matched by any substring of the compacted value
+IDENTIFIER_FIELDS = [
+    "contract_number",
+    "file_number",
+    "vehicle.registration_number",
+    "vehicle_number",
+]
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def _get(document: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def normalize_words(text) -> list:
+    """Lowercase and split on anything that is not a letter or digit"""
+    if not text:
+        return []
+    return [w for w in _NON_ALNUM.split(str(text).lower()) if w]
+
+
+def compact(text) -> str:
+    return "".join(normalize_words(text))
+
+
+def _prefixes(word: str):
+    return {word[:n] for n in range(1, min(len(word), MAX_TOKEN_LENGTH) + 1)}
+
+
+def _substrings(value: str):
+    tokens = set()
+    for start in range(len(value)):
+        for end in range(start + 1, min(len(value), start + MAX_TOKEN_LENGTH) + 1):
+            tokens.add(value[start:end])
+    return tokens
+
+
+def search_tokens(contract: dict) -> list:
+    """Compute the search token array for one contract document"""
+    tokens = set()
+    for field in WORD_FIELDS:
+        for word in normalize_words(_get(contract, field)):
+            tokens |= _prefixes(word)
+            tokens.add(EXACT_MARKER + word)
+    for field in IDENTIFIER_FIELDS:
+        value = compact(_get(contract, field))
+        if value:
+            tokens |= _substrings(value)
+            tokens.add(EXACT_MARKER + value)
+    return sorted(tokens)
+
+
+def query_tokens(search: str) -> list:
+    return sorted({word[:MAX_TOKEN_LENGTH] for word in normalize_words(search)})
+
+
+def search_filter(search: str) -> dict:
+    """Mongo filter matching contracts that contain every word of ``search``"""
+    tokens = query_tokens(search)
+    if not tokens:
+        return {}
+    return {SEARCH_TOKENS_FIELD: {"$all": tokens}}
+
+
+def score_expression(search: str) -> dict:
+    """Aggregation expression ranking contracts by whole-word hits.
+
+    Every result already matches all query words as prefixes/substrings, so
+    the score counts how many of them are also complete words or
+    identifiers.
+    """
+    exact = [EXACT_MARKER + word for word in normalize_words(search)]
+    return {"$size": {"$setIntersection": [
+        {"$ifNull": ["$" + SEARCH_TOKENS_FIELD, []]},
+        exact,
+    ]}}
+
+
+async def reindex(db, batch_size=500):
+    """Recompute search_tokens for every contract; returns the number updated"""
+    from pymongo import UpdateOne
+
+    updated = 0
+    batch = []
+    async for contract in db.contracts.find({}, {field: 1 for field in WORD_FIELDS + IDENTIFIER_FIELDS}):
+        batch.append(UpdateOne({"_id": contract["_id"]},
+                               {"$set": {SEARCH_TOKENS_FIELD: search_tokens(contract)}}))
+        if len(batch) >= batch_size:
+            updated += (await db.contracts.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.contracts.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    updated = asyncio.run(reindex(db))
+    client.close()
+    print(f"Search tokens updated on {updated} contracts")
+
+
+if __name__ == "__main__":
+    main()
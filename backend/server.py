@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -8,13 +8,32 @@ import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
-import uuid
-from datetime import datetime, timedelta
-import bcrypt
+from datetime import date, datetime, timedelta
 import jwt
 from bson import ObjectId
-import random
+import asyncio
 import base64
+import json
+import time
+from contextlib import asynccontextmanager
+
+import fastjson
+from amortization import amortize, schedule_rows, schedules
+from arrears import BUCKET_NAMES, refresh_arrears
+from compression import CompressionMiddleware, Compressor
+from importer import (DEFAULT_BATCH_SIZE, ImportProgress, InvalidContractError, apply_delta, begin_staging,
+                      insert_staged, prepare_contract, promote_staging, rollback_import, stream_import)
+from indexes import ensure_indexes
+from models import Contract
+from passwords import LoginThrottled, PasswordPool, PasswordPoolBusy, verify_password
+from photos import get_bucket, is_photo_hash, open_photo, parse_range
+from portfolio import load_summary, refresh_summary
+from response_cache import DataVersion, ResponseCache, etag_matches
+from search import SEARCH_SCORE_FIELD, score_expression, search_filter
+from subresources import SUB_RESOURCES
+from synthetic import (DEFAULT_BATCH_SIZE as SYNTHETIC_BATCH_SIZE, DEFAULT_COUNT as SYNTHETIC_COUNT,
+                       DEFAULT_PASSWORD, DEFAULT_SEED as SYNTHETIC_SEED, DEFAULT_USERNAME, ensure_user, generate)
+from token_cache import TokenCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -23,12 +42,79 @@ load_dotenv(ROOT_DIR / '.env')
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+photo_bucket = get_bucket(db)
 
 # JWT settings
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
+# Verified token cache; clear it with token_cache.clear() after a key change
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', 300))
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+# bcrypt runs on its own threads so logins never block the event loop
+password_pool = PasswordPool(
+    workers=int(os.environ.get('PASSWORD_WORKERS', 2)),
+    max_pending=int(os.environ.get('PASSWORD_MAX_PENDING', 32)),
+    per_user=int(os.environ.get('LOGIN_LIMIT_PER_USER', 2)),
+    per_ip=int(os.environ.get('LOGIN_LIMIT_PER_IP', 8)),
+)
+
+# Serialized contract responses, valid until the next import bumps the data version
+RESPONSE_CACHE_MB = float(os.environ.get('RESPONSE_CACHE_MB', 64))
+data_version = DataVersion(db.meta, float(os.environ.get('DATA_VERSION_REFRESH', 1.0)))
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
+
+# Compress JSON responses of at least COMPRESSION_MIN_SIZE bytes
+compressor = Compressor(
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    gzip_level=int(os.environ.get('GZIP_LEVEL', 6)),
+    brotli_quality=int(os.environ.get('BROTLI_QUALITY', 5)),
+)
+
+# Contract list pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# sort_by -> (field, direction); "id" is appended as a unique tiebreaker so
+# the keyset cursor always points at exactly one document. sort_by=relevance
+# ranks search results by SEARCH_SCORE_FIELD instead.
+CONTRACT_SORTS = {
+    "date": ("contract_date_iso", -1),
+    "customer": ("customer.name", 1),
+    "amount": ("loan.outstanding_amount", -1),
+    "dpd": ("arrears.dpd", -1),
+    "overdue": ("arrears.overdue_amount", -1),
+}
+
+# Only the scalar fields ContractListItem needs; keeps photos and the payment
+# schedule out of list queries entirely
+CONTRACT_LIST_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "contract_number": 1,
+    "contract_date": 1,
+    "contract_date_iso": 1,
+    "status": 1,
+    "company_name": 1,
+    "customer.name": 1,
+    "vehicle.registration_number": 1,
+    "loan.outstanding_amount": 1,
+    "loan.emi_amount": 1,
+    "arrears.dpd": 1,
+    "arrears.overdue_amount": 1,
+    "arrears.bucket": 1,
+}
+
+# Ledger and followup pages; newest first unless order=asc
+DEFAULT_ROWS_PAGE_SIZE = 50
+ROWS_PROJECTION = {"_id": 0, "contract_id": 0}
+
+# Internal fields left out of contract detail responses
+CONTRACT_DETAIL_PROJECTION = {"_id": 0, "search_tokens": 0, "contract_date_iso": 0}
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -37,6 +123,12 @@ api_router = APIRouter(prefix="/api")
 
 security = HTTPBearer()
 
+import_progress = ImportProgress()
+
+# Held by every write to the book, from begin_staging until the data
+# version is bumped; per process, so run imports against a single worker
+import_lock = asyncio.Lock()
+
 # Models
 class User(BaseModel):
     username: str
@@ -55,54 +147,38 @@ class LoginResponse(BaseModel):
     token_type: str = "bearer"
     username: str
 
-class Customer(BaseModel):
-    name: str
-    phone: str
-    address: str
-    photo: str  # base64 encoded image
-
-class Guarantor(BaseModel):
-    name: str
-    phone: str
-    address: str
-    relation: str
-    photo: str  # base64 encoded image
-
-class Vehicle(BaseModel):
-    make: str
-    model: str
-    year: int
-    registration_number: str
-    vin: str
-    color: str
-
-class PaymentSchedule(BaseModel):
-    installment_number: int
-    due_date: str
-    amount: float
-    status: str  # paid, pending, overdue
-    paid_date: Optional[str] = None
-
-class LoanDetails(BaseModel):
-    loan_amount: float
-    interest_rate: float
-    tenure_months: int
-    emi_amount: float
-    total_amount: float
-    amount_paid: float
-    outstanding_amount: float
+class ContractDelta(BaseModel):
+    since: Optional[str] = None
+    contracts: List[dict] = []
+    deleted: List[str] = []
 
-class Contract(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    contract_number: str
-    contract_date: str
-    status: str  # active, completed, overdue
-    customer: Customer
-    guarantor: Guarantor
-    vehicle: Vehicle
-    loan: LoanDetails
-    payment_schedule: List[PaymentSchedule]
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+class LedgerEntry(BaseModel):
+    seq: int
+    date: str  # ISO voucher_date, for sorting and ranges
+    voucher_date: str
+    voucher_type: str
+    voucher_no: str
+    debit: float
+    credit: float
+    narration: str
+    running_balance: float
+
+class FollowupEntry(BaseModel):
+    seq: int
+    date: str  # ISO run_date, for sorting and ranges
+    serial: int
+    run_date: str
+    cont_date: str
+    remarks: str
+
+class LoanTerms(BaseModel):
+    principal: float = Field(gt=0)
+    annual_rate: float = Field(ge=0, le=100)  # percent, e.g. 10.5
+    tenure_months: int = Field(ge=1, le=600)
+
+class AmortizationRequest(BaseModel):
+    loans: List[LoanTerms] = Field(min_length=1, max_length=100000)
+    include_schedule: bool = False
 
 class ContractListItem(BaseModel):
     id: str
@@ -114,14 +190,11 @@ class ContractListItem(BaseModel):
     outstanding_amount: float
     emi_amount: float
     contract_date: str
+    dpd: int = 0
+    overdue_amount: float = 0.0
+    aging_bucket: str = "current"
 
 # Helper functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -130,51 +203,181 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    if token_cache.is_revoked(token):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    
     try:
-        token = credentials.credentials
+        started = time.perf_counter()
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.record_decode(time.perf_counter() - started)
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials"
             )
-        return username
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired"
         )
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
+    
+    # Tokens without exp are cached for the TTL only
+    token_cache.put(token, username, payload.get("exp"))
+    return username
+
+def encode_cursor(value, tiebreak) -> str:
+    raw = json.dumps([value, tiebreak], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, tiebreak = json.loads(base64.urlsafe_b64decode(padded))
+        return value, tiebreak
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-# Generate sample base64 image (colored rectangle)
-def generate_sample_image(color: str) -> str:
-    # Simple SVG converted to base64
-    svg = f'''<svg width="200" height="200" xmlns="http://www.w3.org/2000/svg">
-        <rect width="200" height="200" fill="{color}"/>
-        <text x="100" y="100" text-anchor="middle" fill="white" font-size="20">Photo</text>
-    </svg>'''
-    return f"data:image/svg+xml;base64,{base64.b64encode(svg.encode()).decode()}"
+def keyset_filter(field: str, direction: int, cursor: str, tiebreak_field: str = "id") -> dict:
+    """Match documents that come strictly after the cursor in (field, tiebreak_field) order"""
+    value, tiebreak = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, tiebreak_field: {op: tiebreak}},
+    ]}
+
+def get_path(document: dict, path: str):
+    for part in path.split("."):
+        document = (document or {}).get(part)
+    return document
+
+def to_list_item(contract: dict) -> dict:
+    """Build a ContractListItem-shaped row from a document fetched with
+    CONTRACT_LIST_PROJECTION. prepare_contract validated the contract
+    against Contract when it was stored, so the row is a plain dict rather
+    than a model."""
+    return {
+        "id": contract['id'],
+        "contract_number": contract['contract_number'],
+        "customer_name": contract['customer']['name'],
+        "vehicle_registration": contract['vehicle']['registration_number'],
+        "company_name": contract.get('company_name', 'Vehicle Finance Ltd'),
+        "status": contract['status'],
+        "outstanding_amount": contract['loan']['outstanding_amount'],
+        "emi_amount": contract['loan']['emi_amount'],
+        "contract_date": contract['contract_date'],
+        "dpd": contract.get('arrears', {}).get('dpd', 0),
+        "overdue_amount": contract.get('arrears', {}).get('overdue_amount', 0.0),
+        "aging_bucket": contract.get('arrears', {}).get('bucket', 'current'),
+    }
+
+async def cached_json(request: Request, key: tuple, build):
+    """Serve a JSON response from the response cache, building it on a miss.
+
+    build() returns (content, headers); content is encoded with fastjson
+    as-is, without response_model validation. Responses carry an ETag, and
+    a matching If-None-Match gets a 304 without a body.
+    """
+    version = await data_version.get()
+    entry = response_cache.get((version,) + key)
+    if entry is None:
+        content, headers = await build()
+        body = fastjson.dumps(content)
+        entry = response_cache.put((version,) + key, body, headers)
+    
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    
+    # Compressed once per entry and encoding, then reused
+    encoding = compressor.choose(request.headers.get("accept-encoding"))
+    if encoding and compressor.worth_compressing(entry.body):
+        body = entry.encoded(encoding, compressor.compress)
+        compressor.record(encoding, len(entry.body), len(body), precompressed=True)
+        headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+@asynccontextmanager
+async def exclusive_import():
+    """Hold import_lock for the block, or fail with 409 if another import,
+    delta, rollback or seed holds it"""
+    # locked() and acquiring an unlocked Lock do not yield, so no other
+    # request can get in between
+    if import_lock.locked():
+        raise HTTPException(status_code=409, detail="An import is already running")
+    async with import_lock:
+        yield
+
+async def data_changed(ids=None, as_of=None):
+    """Call after every write to contracts so arrears and the portfolio
+    summary are recomputed and cached responses are dropped. Pass the
+    contract ids a delta wrote to recompute arrears for those only, and
+    as_of to age the book as of a date other than today."""
+    try:
+        await refresh_arrears(db, as_of, ids=ids)
+    except Exception as e:
+        logger.error(f"Arrears refresh failed: {e}")
+    try:
+        await refresh_summary(db)
+    except Exception as e:
+        # The import itself succeeded; the summary catches up on the next one
+        logger.error(f"Portfolio summary refresh failed: {e}")
+    await data_version.bump()
+    response_cache.clear()
 
 # Routes
 @api_router.post("/auth/login", response_model=LoginResponse)
-async def login(login_data: LoginRequest):
-    user = await db.users.find_one({"username": login_data.username})
-    if not user:
+async def login(login_data: LoginRequest, request: Request):
+    started = time.perf_counter()
+    client_ip = request.client.host if request.client else "unknown"
+    success = False
+    admitted = False
+    try:
+        async with password_pool.limit(login_data.username, client_ip):
+            admitted = True
+            user = await db.users.find_one({"username": login_data.username})
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid username or password"
+                )
+            
+            if not await password_pool.run(verify_password, login_data.password, user['hashed_password']):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid username or password"
+                )
+            success = True
+    except LoginThrottled:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid username or password"
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts in progress",
+            headers={"Retry-After": "1"}
         )
-    
-    if not verify_password(login_data.password, user['hashed_password']):
+    except PasswordPoolBusy:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid username or password"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login service busy, try again",
+            headers={"Retry-After": "1"}
         )
+    finally:
+        if admitted:
+            password_pool.record_login(time.perf_counter() - started, success)
     
     access_token = create_access_token(data={"sub": login_data.username})
     return LoginResponse(
@@ -182,213 +385,387 @@ async def login(login_data: LoginRequest):
         username=login_data.username
     )
 
+@api_router.get("/auth/login-stats")
+async def login_stats(username: str = Depends(verify_token)):
+    """Login outcomes and latency percentiles"""
+    return password_pool.stats()
+
+@api_router.post("/auth/logout")
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    username: str = Depends(verify_token)
+):
+    # verify_token has accepted the token, but it may have expired since
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM],
+                             options={"verify_exp": False})
+    except jwt.InvalidTokenError:
+        payload = {}
+    # Only this worker refuses the token from now on; see token_cache.py
+    token_cache.revoke(credentials.credentials, payload.get("exp"))
+    return {"message": "Logged out"}
+
+@api_router.get("/auth/cache-stats")
+async def token_cache_stats(username: str = Depends(verify_token)):
+    """Hit rate and CPU saved by the verified token cache"""
+    return token_cache.stats()
+
 @api_router.get("/contracts", response_model=List[ContractListItem])
 async def get_contracts(
+    request: Request,
     search: Optional[str] = None,
     status_filter: Optional[str] = None,
+    aging_bucket: Optional[str] = Query(None, description=", ".join(BUCKET_NAMES)),
+    min_dpd: Optional[int] = Query(None, ge=0),
     sort_by: Optional[str] = "date",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     username: str = Depends(verify_token)
 ):
+    """List contracts one page at a time.
+
+    Pass the ``X-Next-Cursor`` response header back as ``after`` to fetch the
+    next page; the header is absent on the last page. sort_by=dpd or
+    sort_by=overdue puts the worst arrears first.
+    """
+    async def build():
+        return await load_contract_page(search, status_filter, aging_bucket, min_dpd, sort_by, limit, after)
+    
+    key = ("contracts", search, status_filter, aging_bucket, min_dpd, sort_by, limit, after)
+    return await cached_json(request, key, build)
+
+async def load_contract_page(search, status_filter, aging_bucket, min_dpd, sort_by, limit, after):
+    """(list items, headers) for one page of get_contracts"""
     query = {}
     
-    # Search functionality
+    # Search functionality, served by the search_tokens index
     if search:
-        query["$or"] = [
-            {"customer.name": {"$regex": search, "$options": "i"}},
-            {"contract_number": {"$regex": search, "$options": "i"}},
-            {"vehicle.make": {"$regex": search, "$options": "i"}},
-            {"vehicle.model": {"$regex": search, "$options": "i"}},
-        ]
+        query.update(search_filter(search))
     
     # Status filter
     if status_filter and status_filter != "all":
         query["status"] = status_filter
     
-    contracts = await db.contracts.find(query).to_list(1000)
+    # Arrears filters, computed by arrears.py
+    if aging_bucket:
+        query["arrears.bucket"] = aging_bucket
+    if min_dpd:
+        query["arrears.dpd"] = {"$gte": min_dpd}
     
-    # Convert to list items
-    contract_list = []
-    for contract in contracts:
-        contract_list.append(ContractListItem(
-            id=contract['id'],
-            contract_number=contract['contract_number'],
-            customer_name=contract['customer']['name'],
-            vehicle_registration=contract['vehicle']['registration_number'],
-            company_name=contract.get('company_name', 'Vehicle Finance Ltd'),
-            status=contract['status'],
-            outstanding_amount=contract['loan']['outstanding_amount'],
-            emi_amount=contract['loan']['emi_amount'],
-            contract_date=contract['contract_date']
-        ))
+    if search and sort_by == "relevance":
+        # Rank by whole-word hits; the token filter keeps the candidate set small
+        sort_field, direction = SEARCH_SCORE_FIELD, -1
+        pipeline = [
+            {"$match": query},
+            {"$addFields": {SEARCH_SCORE_FIELD: score_expression(search)}},
+        ]
+        if after:
+            pipeline.append({"$match": keyset_filter(sort_field, direction, after)})
+        pipeline += [
+            {"$sort": {sort_field: direction, "id": direction}},
+            {"$limit": limit + 1},
+            {"$project": {**CONTRACT_LIST_PROJECTION, SEARCH_SCORE_FIELD: 1}},
+        ]
+        contracts = await db.contracts.aggregate(pipeline).to_list(limit + 1)
+    else:
+        # Sorting happens in MongoDB; unknown sort_by values fall back to date
+        sort_field, direction = CONTRACT_SORTS.get(sort_by, CONTRACT_SORTS["date"])
+        if after:
+            query = {"$and": [query, keyset_filter(sort_field, direction, after)]}
+        
+        # Fetch one extra document to know whether another page exists
+        cursor = db.contracts.find(query, CONTRACT_LIST_PROJECTION).sort([(sort_field, direction), ("id", direction)]).limit(limit + 1)
+        contracts = await cursor.to_list(limit + 1)
     
-    # Sorting
-    if sort_by == "date":
-        contract_list.sort(key=lambda x: x.contract_date, reverse=True)
-    elif sort_by == "customer":
-        contract_list.sort(key=lambda x: x.customer_name)
-    elif sort_by == "amount":
-        contract_list.sort(key=lambda x: x.outstanding_amount, reverse=True)
+    headers = {}
+    has_more = len(contracts) > limit
+    contracts = contracts[:limit]
+    if has_more:
+        last = contracts[-1]
+        headers["X-Next-Cursor"] = encode_cursor(get_path(last, sort_field), last['id'])
     
-    return contract_list
+    return [to_list_item(contract) for contract in contracts], headers
+
+@api_router.get("/contracts/cache-stats")
+async def response_cache_stats(username: str = Depends(verify_token)):
+    """Hit rate of the contract response cache and how many 304s it served"""
+    return {"data_version": await data_version.get(), **response_cache.stats()}
 
 @api_router.get("/contracts/{contract_id}", response_model=Contract)
 async def get_contract_detail(
     contract_id: str,
+    request: Request,
     username: str = Depends(verify_token)
 ):
-    contract = await db.contracts.find_one({"id": contract_id})
-    if not contract:
+    async def build():
+        # Served as stored; prepare_contract validated it against Contract
+        contract = await db.contracts.find_one({"id": contract_id}, CONTRACT_DETAIL_PROJECTION)
+        if not contract:
+            raise HTTPException(status_code=404, detail="Contract not found")
+        return contract, {}
+    
+    return await cached_json(request, ("contract", contract_id), build)
+
+async def load_rows_page(field, contract_id, from_date, to_date, order, limit, after):
+    """(rows, headers) for one page of a contract's ledger or followup"""
+    collection, _ = SUB_RESOURCES[field]
+    direction = 1 if order == "asc" else -1
+    query = {"contract_id": contract_id}
+    if from_date or to_date:
+        query["date"] = {}
+        if from_date:
+            query["date"]["$gte"] = from_date
+        if to_date:
+            query["date"]["$lte"] = to_date
+    if after:
+        query = {"$and": [query, keyset_filter("date", direction, after, "seq")]}
+    
+    # Served by the (contract_id, date, seq) index in either direction
+    cursor = db[collection].find(query, ROWS_PROJECTION).sort([("date", direction), ("seq", direction)]).limit(limit + 1)
+    rows = await cursor.to_list(limit + 1)
+    if not rows and not after and not await db.contracts.find_one({"id": contract_id}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Contract not found")
     
-    # Remove MongoDB _id field
-    contract.pop('_id', None)
-    return Contract(**contract)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1]["date"], rows[-1]["seq"])
+    return rows, headers
 
-@api_router.post("/import-data")
-async def import_data(contracts_data: List[dict]):
-    """Import contracts data from converted file"""
+@api_router.get("/contracts/{contract_id}/ledger", response_model=List[LedgerEntry])
+async def get_contract_ledger(
+    contract_id: str,
+    request: Request,
+    from_date: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    to_date: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(DEFAULT_ROWS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    username: str = Depends(verify_token)
+):
+    """Vouchers of one contract, latest first; e.g. limit=20 for the last 20.
+
+    Paged like /contracts through the ``X-Next-Cursor`` header.
+    """
+    async def build():
+        return await load_rows_page("ledger", contract_id, from_date, to_date, order, limit, after)
+    
+    key = ("ledger", contract_id, from_date, to_date, order, limit, after)
+    return await cached_json(request, key, build)
+
+@api_router.get("/contracts/{contract_id}/followup", response_model=List[FollowupEntry])
+async def get_contract_followup(
+    contract_id: str,
+    request: Request,
+    from_date: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    to_date: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(DEFAULT_ROWS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    username: str = Depends(verify_token)
+):
+    """Collection followups of one contract, latest first, paged like the ledger"""
+    async def build():
+        return await load_rows_page("followup", contract_id, from_date, to_date, order, limit, after)
+    
+    key = ("followup", contract_id, from_date, to_date, order, limit, after)
+    return await cached_json(request, key, build)
+
+@api_router.get("/portfolio/summary")
+async def get_portfolio_summary(request: Request, username: str = Depends(verify_token)):
+    """Contract counts and amounts by status and company, precomputed on import"""
+    async def build():
+        return await load_summary(db), {}
+    
+    return await cached_json(request, ("portfolio_summary",), build)
+
+@api_router.post("/arrears/refresh")
+async def arrears_refresh(
+    as_of: Optional[str] = Query(None, description="YYYY-MM-DD, default today"),
+    username: str = Depends(verify_token)
+):
+    """Recompute DPD and aging for every contract; run daily"""
     try:
-        # Clear existing data
-        await db.contracts.delete_many({})
-        
-        # Insert new data
-        if contracts_data:
-            await db.contracts.insert_many(contracts_data)
-        
-        return {
-            "message": "Data imported successfully",
-            "contracts_imported": len(contracts_data)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+        as_of_date = datetime.strptime(as_of, "%Y-%m-%d").date() if as_of else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="as_of must be YYYY-MM-DD")
+    async with exclusive_import():
+        stats = await refresh_arrears(db, as_of_date)
+        await refresh_summary(db)
+        await data_version.bump()
+        response_cache.clear()
+    return stats
 
-@api_router.post("/seed-data")
-async def seed_sample_data():
-    """Generate sample data for testing"""
-    # Clear existing data first
-    await db.contracts.delete_many({})
+@api_router.post("/amortization")
+def amortization(amortization_request: AmortizationRequest, username: str = Depends(verify_token)):
+    """EMI, totals and optionally full schedules for what-if and
+    restructuring calculations; see amortization.py for the rounding rules.
+
+    A plain def, so FastAPI runs it on its threadpool: large requests take
+    about a second of CPU, which must not stall the event loop.
+    """
+    if amortization_request.include_schedule and len(amortization_request.loans) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Schedules are limited to {MAX_PAGE_SIZE} loans per request")
     
-    # Create default user
-    existing_user = await db.users.find_one({"username": "admin"})
-    if not existing_user:
-        await db.users.insert_one({
-            "username": "admin",
-            "hashed_password": hash_password("admin123")
-        })
+    principal = [loan.principal for loan in amortization_request.loans]
+    rate = [loan.annual_rate for loan in amortization_request.loans]
+    tenure = [loan.tenure_months for loan in amortization_request.loans]
+    totals = amortize(principal, rate, tenure)
+    results = [
+        {name: float(values[i]) for name, values in totals.items()}
+        for i in range(len(amortization_request.loans))
+    ]
+    if amortization_request.include_schedule:
+        rows = schedules(principal, rate, tenure)
+        for i, loan in enumerate(amortization_request.loans):
+            results[i]["schedule"] = schedule_rows(rows, i, loan.tenure_months)
+    return Response(content=fastjson.dumps({"loans": results}), media_type="application/json")
+
+@api_router.get("/compression-stats")
+async def compression_stats(username: str = Depends(verify_token)):
+    """Bytes saved by response compression, per encoding"""
+    return compressor.stats()
+
+@api_router.get("/photos/{photo_hash}")
+async def get_photo(
+    photo_hash: str,
+    request: Request,
+    username: str = Depends(verify_token)
+):
+    """Serve a stored photo; immutable, so clients may cache it forever"""
+    if not is_photo_hash(photo_hash):
+        raise HTTPException(status_code=404, detail="Photo not found")
     
-    # Sample data
-    customer_names = ["Rajesh Kumar", "Priya Sharma", "Amit Patel", "Sneha Reddy", "Vikram Singh",
-                      "Anita Desai", "Rahul Verma", "Deepika Rao", "Suresh Nair", "Kavita Joshi"]
-    guarantor_names = ["Ramesh Kumar", "Sunita Sharma", "Prakash Patel", "Lakshmi Reddy", "Harpreet Singh",
-                       "Manjula Desai", "Ravi Verma", "Padma Rao", "Krishna Nair", "Meena Joshi"]
-    vehicle_makes = ["Maruti Suzuki", "Hyundai", "Tata", "Mahindra", "Honda"]
-    vehicle_models = ["Swift", "i20", "Nexon", "XUV300", "City", "Venue", "Altroz", "Scorpio"]
-    colors = ["White", "Silver", "Black", "Red", "Blue"]
-    relations = ["Father", "Brother", "Uncle", "Friend", "Colleague"]
-    companies = ["HDFC Bank", "ICICI Bank", "SBI Auto Finance", "Bajaj Finance", "Kotak Mahindra"]
+    etag = f'"{photo_hash}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
     
-    contracts = []
-    base_date = datetime(2023, 1, 1)
+    photo = await open_photo(photo_bucket, photo_hash)
+    if photo is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    content_type = (photo.metadata or {}).get("content_type", "application/octet-stream")
     
-    for i in range(10):
-        contract_date = base_date + timedelta(days=i*30)
-        tenure = random.choice([12, 24, 36, 48, 60])
-        loan_amount = random.randint(200000, 1000000)
-        interest_rate = random.uniform(8.5, 12.5)
-        
-        # Calculate EMI
-        monthly_rate = interest_rate / 12 / 100
-        emi = loan_amount * monthly_rate * ((1 + monthly_rate) ** tenure) / (((1 + monthly_rate) ** tenure) - 1)
-        emi = round(emi, 2)
-        total_amount = emi * tenure
-        
-        # Calculate paid amount (random progress)
-        months_elapsed = random.randint(0, min(tenure, 24))
-        amount_paid = emi * months_elapsed
-        outstanding = total_amount - amount_paid
-        
-        # Determine status - Only Live or Seized (no completed)
-        if months_elapsed >= tenure:
-            # Skip completed agreements
-            continue
-        elif random.random() < 0.3:
-            status = "seized"
-        else:
-            status = "live"
-        
-        # Generate payment schedule
-        payment_schedule = []
-        for month in range(1, tenure + 1):
-            due_date = contract_date + timedelta(days=month*30)
-            if month <= months_elapsed:
-                payment_status = "paid"
-                paid_date = due_date.strftime("%Y-%m-%d")
-            elif month == months_elapsed + 1 and status == "overdue":
-                payment_status = "overdue"
-                paid_date = None
-            else:
-                payment_status = "pending"
-                paid_date = None
-            
-            payment_schedule.append(PaymentSchedule(
-                installment_number=month,
-                due_date=due_date.strftime("%Y-%m-%d"),
-                amount=emi,
-                status=payment_status,
-                paid_date=paid_date
-            ).dict())
-        
-        company_name = random.choice(companies)
-        
-        contract = Contract(
-            contract_number=f"VF{2023}{str(i+1).zfill(4)}",
-            contract_date=contract_date.strftime("%Y-%m-%d"),
-            status=status,
-            customer=Customer(
-                name=customer_names[i],
-                phone=f"+91 {random.randint(7000000000, 9999999999)}",
-                address=f"{random.randint(1, 999)} Main Street, City-{random.randint(100000, 999999)}",
-                photo=generate_sample_image("#4A90E2")
-            ),
-            guarantor=Guarantor(
-                name=guarantor_names[i],
-                phone=f"+91 {random.randint(7000000000, 9999999999)}",
-                address=f"{random.randint(1, 999)} Park Avenue, City-{random.randint(100000, 999999)}",
-                relation=relations[i % len(relations)],
-                photo=generate_sample_image("#E94B3C")
-            ),
-            vehicle=Vehicle(
-                make=random.choice(vehicle_makes),
-                model=random.choice(vehicle_models),
-                year=random.randint(2020, 2024),
-                registration_number=f"DL{random.randint(10, 99)}{chr(random.randint(65, 90))}{chr(random.randint(65, 90))}{random.randint(1000, 9999)}",
-                vin=f"MA3{random.randint(10000000, 99999999)}{random.randint(100000, 999999)}",
-                color=random.choice(colors)
-            ),
-            loan=LoanDetails(
-                loan_amount=loan_amount,
-                interest_rate=round(interest_rate, 2),
-                tenure_months=tenure,
-                emi_amount=emi,
-                total_amount=round(total_amount, 2),
-                amount_paid=round(amount_paid, 2),
-                outstanding_amount=round(outstanding, 2)
-            ),
-            payment_schedule=payment_schedule
-        )
-        contract_dict = contract.dict()
-        contract_dict['company_name'] = company_name
-        contracts.append(contract_dict)
+    try:
+        byte_range = parse_range(request.headers.get("range"), photo.length)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{photo.length}"})
+    
+    if byte_range is None:
+        return Response(content=await photo.read(), media_type=content_type, headers=headers)
+    
+    start, end = byte_range
+    photo.seek(start)
+    body = await photo.read(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{photo.length}"
+    return Response(content=body, status_code=206, media_type=content_type, headers=headers)
+
+@api_router.post("/import-data")
+async def import_data(contracts_data: List[dict]):
+    """Import contracts data from converted file"""
+    async with exclusive_import():
+        try:
+            # Load into staging; contracts is replaced only once everything is in
+            await begin_staging(db)
+            contracts_data = [await prepare_contract(contract, photo_bucket) for contract in contracts_data]
+            await insert_staged(db, contracts_data)
+            await promote_staging(db, len(contracts_data))
+            await data_changed()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
     
-    # Insert into database
-    await db.contracts.insert_many(contracts)
+    return {
+        "message": "Data imported successfully",
+        "contracts_imported": len(contracts_data)
+    }
+
+@api_router.post("/import-data/stream")
+async def import_data_stream(
+    request: Request,
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=10000)
+):
+    """Import contracts from an NDJSON or JSON array body without buffering it"""
+    async with exclusive_import():
+        try:
+            await begin_staging(db)
+            stats = await stream_import(db, request.stream(), batch_size, import_progress, photo_bucket)
+            await promote_staging(db, stats["contracts_imported"])
+            await data_changed()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+    return {"message": "Data imported successfully", **stats}
+
+@api_router.get("/import-data/progress")
+async def import_data_progress():
+    """Progress and throughput of the running (or last) streaming import"""
+    return import_progress.as_dict()
+
+@api_router.post("/import-data/delta")
+async def import_data_delta(delta: ContractDelta):
+    """Merge an incremental converter export into the current contracts"""
+    # Never alongside a staged import: the delta would be lost when staging
+    # is renamed over contracts
+    async with exclusive_import():
+        try:
+            result = await apply_delta(db, delta.contracts, delta.deleted, photo_bucket)
+        except InvalidContractError as e:
+            # Rejected before anything was written
+            raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+        except Exception as e:
+            # Part of the delta may have been written before the failure
+            await data_changed()
+            raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+        changed = result.pop("contract_ids")
+        await data_changed(ids=changed)
+    return {"message": "Delta merged successfully", **result}
+
+@api_router.post("/import-data/rollback")
+async def import_data_rollback():
+    """Put back the contracts that the last import replaced"""
+    async with exclusive_import():
+        try:
+            restored = await rollback_import(db)
+            await data_changed()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Rollback failed: {str(e)}")
+    return {"message": "Previous data restored", "contracts_restored": restored}
+
+@api_router.post("/seed-data")
+async def seed_sample_data(
+    count: int = Query(SYNTHETIC_COUNT, ge=0, le=10_000_000),
+    seed: int = SYNTHETIC_SEED,
+    batch_size: int = Query(SYNTHETIC_BATCH_SIZE, ge=1, le=10000),
+    as_of: Optional[str] = Query(None, description="YYYY-MM-DD the book is generated as of, default today")
+):
+    """Replace the book with synthetic contracts for testing.
+
+    The same seed and as_of always give the same book; progress is
+    reported by /import-data/progress.
+    """
+    try:
+        as_of_date = datetime.strptime(as_of, "%Y-%m-%d").date() if as_of else date.today()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="as_of must be YYYY-MM-DD")
+    async with exclusive_import():
+        # Create default user
+        await ensure_user(db, DEFAULT_USERNAME, DEFAULT_PASSWORD, hasher=password_pool.run)
+        
+        stats = await generate(db, count, seed, batch_size, import_progress, photo_bucket, today=as_of_date)
+        # Aged as of the same date the book was generated for
+        await data_changed(as_of=as_of_date)
     
     return {
         "message": "Sample data created successfully",
-        "contracts_created": len(contracts),
+        "contracts_created": stats["contracts_imported"],
+        "as_of": as_of_date.isoformat(),
+        "seconds": stats["seconds"],
         "default_credentials": {
-            "username": "admin",
-            "password": "admin123"
+            "username": DEFAULT_USERNAME,
+            "password": DEFAULT_PASSWORD
         }
     }
 
@@ -401,8 +778,11 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+app.add_middleware(CompressionMiddleware, compressor=compressor)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -410,6 +790,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        # Serve requests anyway; queries still work, just without index support
+        logger.error(f"Index bootstrap failed: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    password_pool.shutdown()
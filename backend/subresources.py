@@ -0,0 +1,146 @@
+"""
+Ledger and collection followup rows, stored apart from their contracts.
+
+The converter emits ``ledger`` and ``followup`` arrays on every contract. A
+long-running contract can carry ten years of vouchers, so the arrays are
+split out on import into their own collections. Each row gets
+``contract_id``, its position ``seq`` and a sortable ISO ``date``, and is
+served a page or a date window at a time by
+GET /api/contracts/{id}/ledger and /followup. The contract keeps only the
+row counts.
+
+Move the arrays of already stored contracts out, and give contracts stored
+before it existed the ``contract_date_iso`` sort key, with:
+
+    python subresources.py
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+
+# contract field -> (collection, row field holding the row's date)
+SUB_RESOURCES = {
+    "ledger": ("ledger", "voucher_date"),
+    "followup": ("followups", "run_date"),
+}
+
+# Formats the converters write dates in
+_DATE_FORMATS = ("%d-%b-%Y", "%Y-%m-%d")
+
+
+def iso_date(value) -> str:
+    """YYYY-MM-DD for a converter date, or "" when it cannot be read"""
+    if not isinstance(value, str) or not value:
+        return ""
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value[:11].strip(), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return ""
+
+
+def split_sub_resources(contract: dict) -> dict:
+    """Pop the ledger and followup arrays off a contract.
+
+    Returns {collection: [rows]} ready to insert, and records
+    ``<field>_count`` on the contract.
+    """
+    rows = {}
+    for field, (collection, date_field) in SUB_RESOURCES.items():
+        entries = contract.pop(field, None)
+        if not isinstance(entries, list):
+            continue
+        rows[collection] = [
+            {**entry, "contract_id": contract["id"], "seq": seq, "date": iso_date(entry.get(date_field))}
+            for seq, entry in enumerate(entries)
+            if isinstance(entry, dict)
+        ]
+        contract[f"{field}_count"] = len(rows[collection])
+    return rows
+
+
+async def insert_rows(db, split_rows, suffix=""):
+    """Insert the {collection: [rows]} maps of split_sub_resources"""
+    for collection, _ in SUB_RESOURCES.values():
+        rows = [row for contract_rows in split_rows for row in contract_rows.get(collection, [])]
+        if rows:
+            await db[collection + suffix].insert_many(rows, ordered=False)
+
+
+async def replace_rows(db, contract_ids, split_rows):
+    """Swap the stored rows of contract_ids for split_rows"""
+    if contract_ids:
+        for collection, _ in SUB_RESOURCES.values():
+            await db[collection].delete_many({"contract_id": {"$in": contract_ids}})
+    await insert_rows(db, split_rows)
+
+
+async def migrate(db, batch_size=200):
+    """Move embedded ledger and followup arrays of stored contracts out"""
+    from pymongo import UpdateOne
+
+    query = {"$or": [{field: {"$type": "array"}} for field in SUB_RESOURCES]}
+    projection = {"id": 1, **{field: 1 for field in SUB_RESOURCES}}
+    unset = {field: "" for field in SUB_RESOURCES}
+    moved = 0
+    contracts = []
+
+    async def flush():
+        await replace_rows(db, [c["id"] for c in contracts], [split_sub_resources(c) for c in contracts])
+        updates = [
+            UpdateOne({"id": c["id"]}, {"$set": {k: v for k, v in c.items() if k.endswith("_count")},
+                                        "$unset": unset})
+            for c in contracts
+        ]
+        return (await db.contracts.bulk_write(updates, ordered=False)).modified_count
+
+    async for contract in db.contracts.find(query, projection):
+        contracts.append(contract)
+        if len(contracts) >= batch_size:
+            moved += await flush()
+            contracts = []
+    if contracts:
+        moved += await flush()
+    return moved
+
+
+async def backfill_contract_dates(db, batch_size=1000):
+    """Set contract_date_iso on stored contracts that lack it"""
+    from pymongo import UpdateOne
+
+    updated = 0
+    updates = []
+    query = {"contract_date_iso": {"$exists": False}}
+    async for contract in db.contracts.find(query, {"id": 1, "contract_date": 1}):
+        updates.append(UpdateOne({"id": contract["id"]},
+                                 {"$set": {"contract_date_iso": iso_date(contract.get("contract_date"))}}))
+        if len(updates) >= batch_size:
+            updated += (await db.contracts.bulk_write(updates, ordered=False)).modified_count
+            updates = []
+    if updates:
+        updated += (await db.contracts.bulk_write(updates, ordered=False)).modified_count
+    return updated
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    async def run():
+        return await migrate(db), await backfill_contract_dates(db)
+
+    moved, dated = asyncio.run(run())
+    client.close()
+    print(f"Ledger and followup rows moved out of {moved} contracts")
+    print(f"Sort key contract_date_iso added to {dated} contracts")
+
+
+if __name__ == "__main__":
+    main()
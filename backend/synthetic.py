@@ -0,0 +1,398 @@
+"""
+Synthetic contract book for development and load testing.
+
+Contracts come out in the shape windows_tool/sql_converter.py exports:
+instalments, ledger vouchers and collection followups included. They go
+through the normal import path, into staging and then promoted, in
+batches, so memory stays bounded by one batch however large the book is.
+The same seed and as-of date always produce the same book, whatever the
+batch size.
+
+Distributions follow a typical two-wheeler / car finance book. Loan
+amounts are log-normal, rates cluster around 11%, and tenures are mostly
+24-36 months. Borrowers mostly pay on time and catch up the instalments
+they miss; about 6% default and stop paying. As of the generation date
+roughly 90% of contracts are current and 4% are 90+ days past due, most
+of those seized.
+
+    python synthetic.py [--count 100000] [--seed 42] [--batch-size 1000] [--as-of 2026-10-18]
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import time
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from amortization import schedules
+
+DEFAULT_COUNT = 10
+DEFAULT_SEED = 42
+DEFAULT_BATCH_SIZE = 1000
+
+DEFAULT_USERNAME = "admin"
+DEFAULT_PASSWORD = "admin123"
+
+FIRST_NAMES = ["Rajesh", "Priya", "Amit", "Sneha", "Vikram", "Anita", "Rahul", "Deepika", "Suresh", "Kavita",
+               "Ramesh", "Sunita", "Prakash", "Lakshmi", "Harpreet", "Manjula", "Ravi", "Padma", "Krishna",
+               "Meena", "Arjun", "Divya", "Sanjay", "Pooja", "Manoj", "Rekha", "Naveen", "Geeta", "Ashok", "Usha"]
+LAST_NAMES = ["Kumar", "Sharma", "Patel", "Reddy", "Singh", "Desai", "Verma", "Rao", "Nair", "Joshi",
+              "Gupta", "Iyer", "Menon", "Pillai", "Das", "Shetty", "Yadav", "Mishra", "Chauhan", "Bose"]
+TITLES = ["Mr.", "Mrs.", "Ms."]
+CITIES = ["Chennai", "Madurai", "Coimbatore", "Salem", "Trichy", "Erode", "Tirunelveli", "Vellore"]
+VEHICLES = [("Hero", "Splendor"), ("Honda", "Activa"), ("TVS", "Jupiter"), ("Bajaj", "Pulsar"),
+            ("Maruti Suzuki", "Swift"), ("Hyundai", "i20"), ("Tata", "Nexon"), ("Mahindra", "XUV300"),
+            ("Ashok Leyland", "Dost"), ("Tata", "Ace")]
+COLOURS = ["White", "Silver", "Black", "Red", "Blue", "Grey"]
+COMPANIES = [("Anjaar Finance", "AF"), ("Anjaar Motors Credit", "AMC"), ("Sri Vel Finance", "SVF")]
+REMARKS = ["Called, promised to pay", "Not reachable", "Visited residence", "Customer out of station",
+           "Part payment collected", "Asked to visit branch", "Guarantor informed", "Cheque bounced"]
+
+# Product mix
+TENURES = np.array([12, 18, 24, 36, 48, 60])
+TENURE_WEIGHTS = np.array([0.08, 0.07, 0.30, 0.30, 0.15, 0.10])
+CLOSED_SHARE = 0.15
+BOOK_YEARS = 6
+
+# Borrower behaviour. Each borrower pays an instalment on time with their
+# own probability and otherwise catches it up a month or two later. A few
+# stop paying altogether from some instalment on, and most of those whose
+# payments stopped over SEIZE_AFTER_DAYS ago have had the vehicle seized.
+RELIABILITY = (12.0, 1.0)
+DEFAULT_SHARE = 0.06
+SEIZED_SHARE = 0.6
+SEIZE_AFTER_DAYS = 90
+PARTIAL_SHARE = 0.1
+
+# Contracts per random stream. Fixed so that the book depends only on the
+# seed and as-of date, never on how it is batched.
+BLOCK_SIZE = 1000
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_DATE_TEXT = {}
+
+
+def date_text(days: int) -> str:
+    """DD-Mon-YYYY (the converter's format) for days since 1970-01-01;
+    cached, dates repeat a lot"""
+    text = _DATE_TEXT.get(days)
+    if text is None:
+        text = date.fromordinal(_EPOCH_ORDINAL + days).strftime("%d-%b-%Y")
+        _DATE_TEXT[days] = text
+    return text
+
+
+def sample_photo(color: str) -> str:
+    svg = f'''<svg width="200" height="200" xmlns="http://www.w3.org/2000/svg">
+        <rect width="200" height="200" fill="{color}"/>
+        <text x="100" y="100" text-anchor="middle" fill="white" font-size="20">Photo</text>
+    </svg>'''
+    return f"data:image/svg+xml;base64,{base64.b64encode(svg.encode()).decode()}"
+
+
+async def store_sample_photos(bucket):
+    """Hashes of the borrower and guarantor placeholder photos"""
+    from photos import decode_data_uri, store_photo
+
+    return [await store_photo(bucket, *decode_data_uri(sample_photo(color))) for color in ("#4A90E2", "#E94B3C")]
+
+
+def _name(first: int, last: int) -> str:
+    return f"{FIRST_NAMES[first % len(FIRST_NAMES)]} {LAST_NAMES[last % len(LAST_NAMES)]}"
+
+
+@lru_cache(maxsize=4)
+def _draw_block(seed: int, block: int, today: date) -> dict:
+    """Every random draw for the BLOCK_SIZE contracts of one block, as
+    plain lists (indexing NumPy arrays element by element is slow).
+
+    Cached: callers generating small batches reuse the block.
+    """
+    size = BLOCK_SIZE
+    rng = np.random.default_rng([seed, block])
+    today = np.datetime64(today, "D")
+
+    tenure = rng.choice(TENURES, size, p=TENURE_WEIGHTS)
+    principal = np.round(np.clip(rng.lognormal(np.log(350_000), 0.6, size), 30_000, 2_500_000), -3)
+    rate = np.round(np.clip(rng.normal(11.0, 1.8, size), 7.0, 24.0), 2)
+    closed = rng.random(size) < CLOSED_SHARE
+    terms = schedules(principal, rate, tenure)
+
+    # Agreement dates over the last BOOK_YEARS; closed contracts are old
+    # enough to have run their full tenure and settled the last instalment
+    age_days = rng.integers(0, BOOK_YEARS * 365, size)
+    age_days = np.where(closed, np.maximum(age_days, tenure * 31 + 30), age_days)
+    agreed = today - age_days.astype("timedelta64[D]")
+    agreed_month = agreed.astype("datetime64[M]")
+    due_day = np.minimum((agreed - agreed_month.astype("datetime64[D]")).astype(np.int64), 27)
+
+    months = terms["payment"].shape[1]
+    month_offsets = np.arange(1, months + 1)
+    due = ((agreed_month[:, None] + month_offsets.astype("timedelta64[M]")).astype("datetime64[D]")
+           + due_day[:, None].astype("timedelta64[D]"))
+    fell_due = (due <= today) & (month_offsets <= tenure[:, None])
+
+    reliability = rng.beta(*RELIABILITY, size)
+    defaulted = ~closed & (rng.random(size) < DEFAULT_SHARE)
+    stop_at = rng.integers(1, tenure + 1)
+    stopped = defaulted[:, None] & (month_offsets >= stop_at[:, None])
+
+    # On-time payments land within a few days of the due date; missed ones
+    # are caught up one to three months later
+    on_time = closed[:, None] | (rng.random(due.shape) < reliability[:, None])
+    delay = np.where(on_time, rng.geometric(0.35, due.shape) - 1,
+                     30 * rng.geometric(0.6, due.shape) + rng.integers(0, 10, due.shape))
+    received_on = due + delay.astype("timedelta64[D]")
+    paid = fell_due & ~stopped & (received_on <= today)
+
+    # Part of an instalment that is still owed is sometimes collected
+    partial = fell_due & ~paid & (rng.random(due.shape) < PARTIAL_SHARE)
+    partial_on = np.minimum(due + (rng.geometric(0.2, due.shape) - 1).astype("timedelta64[D]"), today)
+    received_on = np.where(partial, partial_on, received_on)
+    received = np.where(paid, terms["payment"], np.where(partial, np.round(terms["payment"] / 2, 2), 0.0))
+    days_late = np.where(paid | partial, received_on - due, np.maximum(today - due, np.timedelta64(0, "D")))
+
+    stopped_since = due[np.arange(size), stop_at - 1]
+    seized = (defaulted & (stopped_since <= today - np.timedelta64(SEIZE_AFTER_DAYS, "D"))
+              & (rng.random(size) < SEIZED_SHARE))
+    status = np.where(closed, "Closed", np.where(seized, "Seized", "Live"))
+
+    return {
+        "tenure": tenure.tolist(),
+        "principal": principal.tolist(),
+        "rate": rate.tolist(),
+        "emi": terms["emi"].tolist(),
+        "status": status.tolist(),
+        "payment": terms["payment"].tolist(),
+        "received": received.tolist(),
+        "days_late": days_late.astype(np.int64).tolist(),
+        "due": due.astype(np.int64).tolist(),
+        "received_on": received_on.astype(np.int64).tolist(),
+        "fell_due": fell_due.tolist(),
+        "agreed": agreed.astype(np.int64).tolist(),
+        "agreed_year": (agreed.astype("datetime64[Y]").astype(np.int64) + 1970).tolist(),
+        "picks": rng.integers(0, 1 << 30, (size, 12)).tolist(),
+    }
+
+
+def _contract(draws: dict, i: int, fn_code: int, photos) -> dict:
+    """Contract fn_code from row i of its block's draws"""
+    fl_code = 100000 + fn_code
+    n = draws["tenure"][i]
+    picks = draws["picks"][i]
+    city = CITIES[picks[2] % len(CITIES)]
+    make, model = VEHICLES[picks[3] % len(VEHICLES)]
+    company, alias = COMPANIES[picks[4] % len(COMPANIES)]
+    registration = f"TN{picks[5] % 90 + 10:02d}{chr(65 + picks[6] % 26)}{chr(65 + picks[7] % 26)}{picks[8] % 9000 + 1000}"
+    customer = f"{TITLES[picks[9] % 3]} {_name(picks[0], picks[1])}"
+    guarantor = _name(picks[10], picks[11])
+    ref_no = f"{alias}/{draws['agreed_year'][i]}/{fn_code:07d}"
+    vin = f"MA3{picks[8] * 16384 + picks[9] % 16384:014d}"
+
+    payments, receipts, due_days = draws["payment"][i], draws["received"][i], draws["due"][i]
+    received_on, days_late, fell_due = draws["received_on"][i], draws["days_late"][i], draws["fell_due"][i]
+    payment_schedule = []
+    vouchers = []  # (day, kind, instalment, amount); kind 0 = DN, 1 = RC
+    followup = []
+    for k in range(n):
+        emi = payments[k]
+        got = receipts[k]
+        payment_schedule.append({
+            "sno": k + 1,
+            "emi_amount": emi,
+            "due_date": date_text(due_days[k]),
+            "payment_received": got,
+            "date_received": date_text(received_on[k]) if got else "",
+            "delay_days": days_late[k],
+        })
+        if not fell_due[k]:
+            continue
+        vouchers.append((due_days[k], 0, k + 1, emi))
+        if got:
+            vouchers.append((received_on[k], 1, k + 1, got))
+        if days_late[k] > 7:
+            run_date = due_days[k] + 7
+            followup.append({
+                "serial": len(followup) + 1,
+                "run_date": date_text(run_date),
+                "cont_date": date_text(run_date + picks[k % 12] % 5),
+                "remarks": REMARKS[(picks[11] + k) % len(REMARKS)],
+            })
+
+    # Catch-up receipts land after later instalments fell due
+    ledger = []
+    balance = 0.0
+    for day, kind, k, amount in sorted(vouchers):
+        balance += -amount if kind else amount
+        ledger.append({
+            "voucher_date": date_text(day),
+            "voucher_type": "RC" if kind else "DN",
+            "voucher_no": f"{'RC' if kind else 'DN'}{fn_code}{k:03d}",
+            "debit": 0.0 if kind else amount,
+            "credit": amount if kind else 0.0,
+            "narration": f"Receipt against instalment {k}" if kind else f"Instalment {k} due",
+            "running_balance": round(balance, 2),
+        })
+
+    amount_paid = round(sum(receipts[:n]), 2)
+    total_amount = round(sum(payments[:n]), 2)
+    return {
+        "_id": str(fn_code),
+        "contract_number": ref_no,
+        "contract_date": date_text(draws["agreed"][i]),
+        "status": draws["status"][i],
+        "customer_name": customer,
+        "vehicle_number": registration,
+        "file_number": ref_no,
+        "fl_code": str(fl_code),
+        "company_name": company,
+        "company_alias": alias,
+        "article_name": make,
+        "photo": photos[0],
+        "customer": {
+            "name": customer,
+            "father": _name(picks[1], picks[2]),
+            "phone": f"9{picks[2] % 1_000_000_000:09d}",
+            "phone2": "",
+            "phone3": "",
+            "address": f"{picks[5] % 300 + 1}, {LAST_NAMES[picks[6] % len(LAST_NAMES)]} Street, {city}",
+            "photo": photos[0],
+        },
+        "guarantor": {
+            "name": guarantor,
+            "father": _name(picks[3], picks[4]),
+            "phone": f"8{picks[7] % 1_000_000_000:09d}",
+            "phone2": "",
+            "phone3": "",
+            "address": f"{picks[8] % 300 + 1}, Main Road, {city}",
+            "relation": "Guarantor",
+            "photo": photos[1],
+        },
+        "vehicle": {
+            "make": make,
+            "model": model,
+            "year": draws["agreed_year"][i],
+            "registration_number": registration,
+            "vin": vin,
+            "chassis_number": vin,
+            "engine_number": f"E{picks[9]:010d}",
+            "color": COLOURS[picks[10] % len(COLOURS)],
+        },
+        "loan": {
+            "loan_amount": draws["principal"][i],
+            "interest_rate": draws["rate"][i],
+            "tenure_months": n,
+            "emi_amount": draws["emi"][i],
+            "total_amount": total_amount,
+            "amount_paid": amount_paid,
+            "outstanding_amount": round(total_amount - amount_paid, 2),
+        },
+        "payment_schedule": payment_schedule,
+        "ledger": ledger,
+        "followup": followup,
+    }
+
+
+def generate_batch(start: int, size: int, seed: int, today: date, photos=(None, None)) -> list:
+    """Contracts start+1 .. start+size as of ``today``.
+
+    Each BLOCK_SIZE run of contracts has its own stream of the seed, so a
+    contract is the same whichever batch it is generated in.
+    """
+    contracts = []
+    for block in range(start // BLOCK_SIZE, (start + size - 1) // BLOCK_SIZE + 1):
+        draws = _draw_block(seed, block, today)
+        first = max(start, block * BLOCK_SIZE)
+        last = min(start + size, (block + 1) * BLOCK_SIZE)
+        contracts += [_contract(draws, index - block * BLOCK_SIZE, index + 1, photos)
+                      for index in range(first, last)]
+    return contracts
+
+
+async def generate(db, count=DEFAULT_COUNT, seed=DEFAULT_SEED, batch_size=DEFAULT_BATCH_SIZE,
+                   progress=None, photos=None, today: date = None) -> dict:
+    """Replace the book with ``count`` synthetic contracts as of ``today``
+    (default: the current date).
+
+    Loads through staging like an import; call the post-import refreshes
+    (arrears, summary, data version) afterwards.
+    """
+    from importer import ImportProgress, begin_staging, insert_staged, prepare_contract, promote_staging
+
+    today = today or date.today()
+    progress = progress or ImportProgress()
+    progress.reset()
+    progress.running = True
+    progress.started_at = time.monotonic()
+    photo_hashes = await store_sample_photos(photos) if photos is not None else (None, None)
+
+    try:
+        await begin_staging(db)
+        for start in range(0, count, batch_size):
+            batch = generate_batch(start, min(batch_size, count - start), seed, today, photo_hashes)
+            batch = [await prepare_contract(contract) for contract in batch]
+            await insert_staged(db, batch)
+            progress.contracts += len(batch)
+            progress.batches += 1
+        await promote_staging(db, count)
+    except Exception as e:
+        progress.error = str(e)
+        raise
+    finally:
+        progress.running = False
+        progress.finished_at = time.monotonic()
+    return progress.as_dict()
+
+
+async def ensure_user(db, username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD, hasher=None):
+    """Create the login used by the app and benchmarks if it is missing"""
+    from passwords import hash_password
+
+    if not await db.users.find_one({"username": username}):
+        hashed = await hasher(hash_password, password) if hasher else hash_password(password)
+        await db.users.insert_one({"username": username, "hashed_password": hashed})
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from arrears import refresh_arrears
+    from photos import get_bucket
+    from portfolio import refresh_summary
+    from response_cache import DataVersion
+
+    parser = argparse.ArgumentParser(description="Replace the contract book with synthetic data")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None,
+                        help="date the book is generated as of, YYYY-MM-DD (default: today)")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    async def run():
+        await ensure_user(db)
+        stats = await generate(db, args.count, args.seed, args.batch_size, photos=get_bucket(db), today=args.as_of)
+        await refresh_arrears(db, args.as_of)
+        await refresh_summary(db)
+        # Running servers drop their cached responses
+        await DataVersion(db.meta).bump()
+        return stats
+
+    stats = asyncio.run(run())
+    client.close()
+    print(f"Generated {stats['contracts_imported']} contracts in {stats['seconds']}s "
+          f"({stats['contracts_per_second']}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Cache of verified access tokens.
+
+verify_token runs on every contract request, and field agents send the same
+token many times a second. A hit skips HS256 verification and JSON decoding.
+Entries are keyed by the token's sha256 digest, so raw tokens are never held,
+and each one expires at the earlier of the token's own ``exp`` (if it has
+one) and the cache TTL.
+
+Call ``revoke`` on logout and ``clear`` when the signing key changes. Both
+act on this process only: with several workers, a token revoked in one is
+still accepted by the others until it expires.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # digest -> (username, expires_at)
+        self._revoked = {}  # digest -> token exp
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._decodes = 0
+        self._decode_seconds = 0.0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        """Username for a cached, unexpired token, else None"""
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            username, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return username
+
+    def put(self, token: str, username: str, exp: float = None):
+        key = self._key(token)
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(float(exp), expires_at)
+        with self._lock:
+            if key in self._revoked:
+                return
+            self._entries[key] = (username, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_decode(self, seconds: float):
+        with self._lock:
+            self._decodes += 1
+            self._decode_seconds += seconds
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def revoke(self, token: str, exp: float = None):
+        """Invalidate and refuse the token until it would have expired
+        anyway; for good if it has no exp"""
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._revoked[key] = float(exp) if exp is not None else math.inf
+            # Forget revocations of tokens that have expired by now
+            for stale in [k for k, e in self._revoked.items() if e <= now]:
+                del self._revoked[stale]
+
+    def is_revoked(self, token: str) -> bool:
+        with self._lock:
+            exp = self._revoked.get(self._key(token))
+        return exp is not None and exp > time.time()
+
+    def clear(self):
+        """Drop every cached token, e.g. after rotating the signing key"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg_decode = self._decode_seconds / self._decodes if self._decodes else 0.0
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "revoked": len(self._revoked),
+                "avg_decode_ms": round(avg_decode * 1000, 4),
+                "cpu_seconds_saved": round(self.hits * avg_decode, 4),
+            }
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Vehicle Finance App Backend Load Benchmark
+Drives login, contract list, detail and import with concurrent async
+clients and reports throughput and p50/p95/p99 latency per endpoint.
+
+Run against a local server and local mongod, e.g.:
+
+    python backend_benchmark.py --seed-count 100000 --concurrency 32 --output run.json
+    python backend_benchmark.py --concurrency 32 --compare run.json
+
+Results are written as JSON so runs can be compared for regressions.
+The import scenario replaces the book, so it only runs when asked for
+(--scenarios ... import); with --seed-count the book is seeded again
+afterwards so later runs see the same data.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+SORTS = ["date", "customer", "amount", "dpd", "overdue"]
+STATUS_FILTERS = [None, "Live", "Seized", "Closed"]
+LIST_OVERALL = "GET /contracts (all)"
+
+# Endpoints whose non-2xx responses are recorded under "<endpoint> (rejected)":
+# the login throttle answers 429 in microseconds, which would otherwise pass
+# for fast logins
+SEPARATE_REJECTED = {"POST /auth/login"}
+REJECTED_SUFFIX = " (rejected)"
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Recorder:
+    """Latency samples and status codes per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.wall: Dict[str, float] = defaultdict(float)
+        self.bytes: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, status: int, size: int):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+        self.bytes[endpoint] += size
+
+    def merge(self, into: str, names):
+        """Also count the samples of names under into"""
+        for name in names:
+            self.latencies[into] += self.latencies[name]
+            self.statuses[into].update(self.statuses[name])
+            self.bytes[into] += self.bytes[name]
+
+    def summary(self) -> Dict[str, dict]:
+        results = {}
+        for endpoint, samples in self.latencies.items():
+            statuses = self.statuses[endpoint]
+            ok = sum(count for status, count in statuses.items() if 200 <= status < 400)
+            wall = self.wall[endpoint] or sum(samples)
+            results[endpoint] = {
+                "requests": len(samples),
+                "ok": ok,
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                "throughput_rps": round(ok / wall, 2) if wall else 0.0,
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+                "max_ms": round(max(samples) * 1000, 2),
+                "avg_bytes": int(self.bytes[endpoint] / len(samples)),
+            }
+        return results
+
+
+class LoadBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = args.base_url.rstrip('/')
+        self.recorder = Recorder()
+        self.token: Optional[str] = None
+        self.contract_ids: List[str] = []
+        self.search_terms: List[str] = []
+
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    async def timed(self, client: httpx.AsyncClient, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, f"{self.base_url}{path}", **kwargs)
+            status, size = response.status_code, len(response.content)
+        except httpx.HTTPError:
+            response, status, size = None, 0, 0
+        if endpoint in SEPARATE_REJECTED and not 200 <= status < 300:
+            endpoint += REJECTED_SUFFIX
+        self.recorder.record(endpoint, time.perf_counter() - started, status, size)
+        return response
+
+    async def run_jobs(self, endpoint: str, jobs, concurrency: int):
+        """Run the (method, path, kwargs) jobs with concurrency workers.
+        endpoint may be a string or a function of the job."""
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(timeout=self.args.timeout, limits=limits) as client:
+            async def worker():
+                while True:
+                    try:
+                        job = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    method, path, kwargs, name = job
+                    await self.timed(client, name, method, path, headers=self.headers(), **kwargs)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        for name in {job[3] for job in jobs}:
+            self.recorder.wall[name] += elapsed
+            if name in SEPARATE_REJECTED:
+                self.recorder.wall[name + REJECTED_SUFFIX] += elapsed
+        if endpoint:
+            self.recorder.wall[endpoint] += elapsed
+
+    # Scenarios
+
+    async def seed(self):
+        print(f"🌱 Seeding {self.args.seed_count} contracts...")
+        async with httpx.AsyncClient(timeout=None) as client:
+            response = await client.post(f"{self.base_url}/api/seed-data", params={
+                "count": self.args.seed_count, "seed": self.args.seed, "as_of": self.args.as_of.isoformat()})
+            response.raise_for_status()
+            print(f"   {response.json()}")
+
+    async def login(self):
+        async with httpx.AsyncClient(timeout=self.args.timeout) as client:
+            response = await client.post(f"{self.base_url}/api/auth/login", json={
+                "username": self.args.username, "password": self.args.password})
+            response.raise_for_status()
+            self.token = response.json()["access_token"]
+
+    async def bench_login(self):
+        body = {"username": self.args.username, "password": self.args.password}
+        jobs = [("POST", "/api/auth/login", {"json": body}, "POST /auth/login")] * self.args.login_requests
+        await self.run_jobs(None, jobs, self.args.concurrency)
+
+    async def discover(self):
+        """Collect contract ids and search terms from the first list pages"""
+        async with httpx.AsyncClient(timeout=self.args.timeout) as client:
+            after = None
+            while len(self.contract_ids) < self.args.sample_ids:
+                params = {"limit": 1000, **({"after": after} if after else {})}
+                response = await client.get(f"{self.base_url}/api/contracts", params=params, headers=self.headers())
+                response.raise_for_status()
+                rows = response.json()
+                self.contract_ids += [row["id"] for row in rows]
+                for row in rows[:50]:
+                    self.search_terms.append(row["customer_name"].split()[-1])
+                    self.search_terms.append(row["vehicle_registration"][-4:])
+                after = response.headers.get("x-next-cursor")
+                if not after:
+                    break
+        self.search_terms = sorted(set(term for term in self.search_terms if term))[:self.args.search_terms]
+        print(f"🔎 {len(self.contract_ids)} contract ids, {len(self.search_terms)} search terms")
+
+    def list_combinations(self):
+        searches = [None] + self.search_terms
+        for sort_by, status_filter, search in itertools.product(SORTS + ["relevance"], STATUS_FILTERS, searches):
+            if sort_by == "relevance" and not search:
+                continue
+            params = {"sort_by": sort_by, "limit": self.args.page_size}
+            if status_filter:
+                params["status_filter"] = status_filter
+            if search:
+                params["search"] = search
+            name = f"GET /contracts sort_by={sort_by} status={status_filter or 'all'} search={'yes' if search else 'no'}"
+            yield params, name
+
+    async def bench_list(self):
+        combinations = list(self.list_combinations())
+        jobs = [
+            ("GET", "/api/contracts", {"params": params}, name)
+            for params, name in combinations
+            for _ in range(self.args.list_requests)
+        ]
+        random.shuffle(jobs)
+        await self.run_jobs(LIST_OVERALL, jobs, self.args.concurrency)
+        # Every combination also counts towards one overall list figure
+        self.recorder.merge(LIST_OVERALL, [name for _, name in combinations])
+
+    async def bench_detail(self):
+        if not self.contract_ids:
+            print("⚠️ No contracts to fetch; skipping detail")
+            return
+        jobs = []
+        for _ in range(self.args.detail_requests):
+            contract_id = random.choice(self.contract_ids)
+            jobs.append(("GET", f"/api/contracts/{contract_id}", {}, "GET /contracts/{id}"))
+            jobs.append(("GET", f"/api/contracts/{contract_id}/ledger", {"params": {"limit": 20}},
+                         "GET /contracts/{id}/ledger"))
+            jobs.append(("GET", f"/api/contracts/{contract_id}/followup", {"params": {"limit": 20}},
+                         "GET /contracts/{id}/followup"))
+        jobs += [("GET", "/api/portfolio/summary", {}, "GET /portfolio/summary")] * self.args.detail_requests
+        random.shuffle(jobs)
+        await self.run_jobs(None, jobs, self.args.concurrency)
+
+    async def bench_import(self):
+        """Stream a generated book through /import-data/stream; replaces the data"""
+        from synthetic import generate_batch
+
+        lines = []
+        for start in range(0, self.args.import_count, 1000):
+            batch = generate_batch(start, min(1000, self.args.import_count - start), self.args.seed, self.args.as_of)
+            lines += [json.dumps(contract) for contract in batch]
+        body = ("\n".join(lines) + "\n").encode()
+        print(f"📦 Importing {self.args.import_count} contracts ({len(body) / 1_000_000:.1f} MB) "
+              f"x{self.args.import_runs}")
+        # Imports are exclusive on the server, so they run one at a time
+        jobs = [("POST", "/api/import-data/stream", {"content": body, "timeout": None},
+                 "POST /import-data/stream")] * self.args.import_runs
+        await self.run_jobs(None, jobs, 1)
+
+    async def run(self) -> dict:
+        if self.args.seed_count:
+            await self.seed()
+        await self.login()
+        await self.discover()
+
+        scenarios = {
+            "login": self.bench_login,
+            "list": self.bench_list,
+            "detail": self.bench_detail,
+            "import": self.bench_import,
+        }
+        for name in self.args.scenarios:
+            if name == "import" and not self.args.import_count:
+                continue
+            print(f"🚀 {name} ({self.args.concurrency} clients)")
+            await scenarios[name]()
+        if "import" in self.args.scenarios and self.args.import_count and self.args.seed_count:
+            await self.seed()
+
+        return {
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat() + "Z",
+                "base_url": self.base_url,
+                "concurrency": self.args.concurrency,
+                "scenarios": self.args.scenarios,
+                "as_of": self.args.as_of.isoformat(),
+                "commit": git_commit(),
+            },
+            "endpoints": self.recorder.summary(),
+        }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(results: dict, baseline: Optional[dict] = None, detail: bool = False):
+    endpoints = results["endpoints"]
+    previous = (baseline or {}).get("endpoints", {})
+    print()
+    print("=" * 110)
+    print(f"{'endpoint':<52}{'req':>7}{'ok':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'p95 Δ':>9}")
+    print("=" * 110)
+    for name in sorted(endpoints):
+        # Individual list combinations are in the JSON; the table keeps the overall figure
+        if name.startswith("GET /contracts sort_by=") and not detail:
+            continue
+        row = endpoints[name]
+        delta = ""
+        if name in previous and previous[name]["p95_ms"]:
+            delta = f"{(row['p95_ms'] / previous[name]['p95_ms'] - 1) * 100:+.0f}%"
+        print(f"{name[:51]:<52}{row['requests']:>7}{row['ok']:>7}{row['throughput_rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{delta:>9}")
+    print("latencies in ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load benchmark for the backend API")
+    parser.add_argument("--base-url", default=os.environ.get("BACKEND_URL", "http://localhost:8001"))
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--scenarios", nargs="+", default=["login", "list", "detail"],
+                        choices=["login", "list", "detail", "import"],
+                        help="import replaces the book and is not run unless listed")
+    parser.add_argument("--seed-count", type=int, default=0, help="replace the book with N synthetic contracts first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", type=date.fromisoformat, default=date.today(),
+                        help="date synthetic books are generated as of, YYYY-MM-DD; fix it to compare runs")
+    parser.add_argument("--login-requests", type=int, default=100)
+    parser.add_argument("--list-requests", type=int, default=20, help="requests per list combination")
+    parser.add_argument("--detail-requests", type=int, default=500)
+    parser.add_argument("--import-count", type=int, default=1000, help="contracts per import; 0 skips import")
+    parser.add_argument("--import-runs", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--sample-ids", type=int, default=5000)
+    parser.add_argument("--search-terms", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare p95 against")
+    parser.add_argument("--detail", action="store_true", help="show every list combination in the table")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(f"🌐 Backend URL: {args.base_url}")
+    results = asyncio.run(LoadBenchmark(args).run())
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline, args.detail)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+
+    # 429s from the login throttle are expected under load; errors are not
+    errors = sum(count for name, row in results["endpoints"].items() if name != LIST_OVERALL
+                 for status, count in row["statuses"].items() if status == "0" or status >= "500")
+    if errors:
+        print(f"❌ {errors} requests failed")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,15 @@ import json
 from datetime import datetime
 import base64
 import os
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from windows_tool.photo_pipeline import process_photos
+    PHOTO_PIPELINE_AVAILABLE = True
+except ImportError:
+    PHOTO_PIPELINE_AVAILABLE = False
 
 # ===== CONFIGURATION =====
 # Update these settings to match your SQL Server setup
@@ -22,6 +31,23 @@ USE_WINDOWS_AUTH = True
 # Output file path
 OUTPUT_FILE = "vehicle_finance_data.json"
 
+# Write JSON without indentation (about half the size, faster to copy to phones)
+COMPACT_OUTPUT = False
+
+# Folder for resized photos. When set, photos are shrunk once (and cached)
+# and the resized version is embedded instead of the full-size original.
+PHOTO_CACHE_DIR = ""
+EMBED_PHOTO_SIZE = "preview"  # "thumb" (96px) or "preview" (480px)
+
+# Photos read at the same time (helps a lot on network shares)
+PHOTO_WORKERS = 8
+
+# Related rows are fetched in parameterized chunks of this many ids
+# (SQL Server allows at most 2100 parameters per statement), with up to
+# FETCH_WORKERS chunks running at once on separate connections
+IN_CHUNK_SIZE = 1000
+FETCH_WORKERS = 4
+
 # ===== SAMPLE SQL QUERIES =====
 # Modify these queries based on your actual table structure
 
@@ -96,15 +122,16 @@ ORDER BY contract_id, installment_number
 """
 
 
+def connection_string():
+    if USE_WINDOWS_AUTH:
+        return f'DRIVER={{SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};Trusted_Connection=yes;'
+    return f'DRIVER={{SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD};'
+
+
 def get_connection():
     """Create database connection"""
     try:
-        if USE_WINDOWS_AUTH:
-            conn_str = f'DRIVER={{SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};Trusted_Connection=yes;'
-        else:
-            conn_str = f'DRIVER={{SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD};'
-        
-        conn = pyodbc.connect(conn_str)
+        conn = pyodbc.connect(connection_string())
         print("✓ Connected to SQL Server successfully")
         return conn
     except Exception as e:
@@ -117,15 +144,50 @@ def get_connection():
         return None
 
 
+def fetch_related(query, ids, chunk_size=IN_CHUNK_SIZE, workers=FETCH_WORKERS):
+    """Run an "IN ({})" query for every distinct id, chunk_size ids per
+    parameterized statement, with chunks spread over worker connections"""
+    distinct = list(dict.fromkeys(i for i in ids if i is not None))
+    chunks = [distinct[i:i + chunk_size] for i in range(0, len(distinct), chunk_size)]
+    if not chunks:
+        return []
+    
+    local = threading.local()
+    opened = []
+    lock = threading.Lock()
+    
+    def run(chunk):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = pyodbc.connect(connection_string())
+            with lock:
+                opened.append(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query.format(','.join('?' * len(chunk))), chunk)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+    
+    try:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            return [row for rows in pool.map(run, chunks) for row in rows]
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+# Built once; every contract without a photo shares it
+PLACEHOLDER_PHOTO = "data:image/svg+xml;base64," + base64.b64encode('''<svg width="200" height="200" xmlns="http://www.w3.org/2000/svg">
+            <rect width="200" height="200" fill="#4A90E2"/>
+            <text x="100" y="100" text-anchor="middle" fill="white" font-size="20">No Photo</text>
+        </svg>'''.encode()).decode()
+
+
 def image_to_base64(image_path):
     """Convert image file to base64 string"""
     if not image_path or not os.path.exists(image_path):
-        # Return a default placeholder SVG
-        svg = '''<svg width="200" height="200" xmlns="http://www.w3.org/2000/svg">
-            <rect width="200" height="200" fill="#4A90E2"/>
-            <text x="100" y="100" text-anchor="middle" fill="white" font-size="20">No Photo</text>
-        </svg>'''
-        return f"data:image/svg+xml;base64,{base64.b64encode(svg.encode()).decode()}"
+        return PLACEHOLDER_PHOTO
     
     try:
         with open(image_path, 'rb') as img_file:
@@ -135,7 +197,141 @@ def image_to_base64(image_path):
             return f"data:{mime_type};base64,{base64.b64encode(img_data).decode()}"
     except Exception as e:
         print(f"Warning: Could not read image {image_path}: {str(e)}")
-        return image_to_base64(None)
+        return PLACEHOLDER_PHOTO
+
+
+class PhotoLoader:
+    """Reads every distinct photo once, in parallel, and serves repeats from memory"""
+    
+    def __init__(self, workers=PHOTO_WORKERS):
+        self.workers = workers
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.missing = 0
+        self._lock = threading.Lock()
+    
+    def _load(self, photo_path):
+        data = image_to_base64(embedded_photo_path(photo_path))
+        if data is PLACEHOLDER_PHOTO:
+            with self._lock:
+                self.missing += 1
+        return data
+    
+    def prefetch(self, paths):
+        """Load all distinct paths concurrently on a bounded thread pool"""
+        distinct = sorted({p for p in paths if p} - self.cache.keys())
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for path, data in zip(distinct, pool.map(self._load, distinct)):
+                self.cache[path] = data
+    
+    def get(self, photo_path):
+        if not photo_path:
+            return PLACEHOLDER_PHOTO
+        if photo_path in self.cache:
+            self.hits += 1
+            return self.cache[photo_path]
+        self.misses += 1
+        data = self.cache[photo_path] = self._load(photo_path)
+        return data
+    
+    def report(self):
+        return (f"✓ Photos: {len(self.cache)} distinct, {self.hits} hits, "
+                f"{self.misses} misses, {self.missing} missing")
+
+
+# photo_path -> {size name: filename in PHOTO_CACHE_DIR}, filled before conversion
+rendered_photos = {}
+
+
+def prepare_photos(paths):
+    """Render thumbnails/previews for every referenced photo"""
+    if not PHOTO_CACHE_DIR:
+        return
+    if not PHOTO_PIPELINE_AVAILABLE:
+        print("⚠ Photo pipeline not found next to this script, embedding original photos")
+        return
+    print("🖼  Resizing photos...")
+    stats, results = process_photos(paths, PHOTO_CACHE_DIR)
+    rendered_photos.update(results)
+    print(f"✓ Photos rendered: {stats['rendered']}, cached: {stats['cached']}, "
+          f"missing: {stats['missing']}, failed: {stats['failed']}")
+
+
+def embedded_photo_path(photo_path):
+    """The resized photo to embed for photo_path, if the pipeline made one"""
+    outputs = rendered_photos.get(photo_path)
+    if outputs and EMBED_PHOTO_SIZE in outputs:
+        return os.path.join(PHOTO_CACHE_DIR, outputs[EMBED_PHOTO_SIZE])
+    return photo_path
+
+
+def build_contract(contract, customer, guarantor, vehicle, payment_schedule, photos):
+    """Build the mobile app contract from one contract row and its related rows"""
+    return {
+        "id": str(contract.contract_id),
+        "contract_number": contract.contract_number,
+        "contract_date": contract.contract_date.strftime("%Y-%m-%d") if hasattr(contract.contract_date, 'strftime') else str(contract.contract_date),
+        "status": contract.status.lower(),
+        "company_name": contract.company_name or "Vehicle Finance Ltd",
+        "customer": {
+            "name": customer.customer_name,
+            "phone": customer.phone or "",
+            "address": customer.address or "",
+            "photo": photos.get(getattr(customer, 'photo_path', None))
+        },
+        "guarantor": {
+            "name": guarantor.guarantor_name,
+            "phone": guarantor.phone or "",
+            "address": guarantor.address or "",
+            "relation": guarantor.relation or "Guarantor",
+            "photo": photos.get(getattr(guarantor, 'photo_path', None))
+        },
+        "vehicle": {
+            "make": vehicle.make,
+            "model": vehicle.model,
+            "year": int(vehicle.year),
+            "registration_number": vehicle.registration_number,
+            "vin": vehicle.vin or "",
+            "color": vehicle.color or "Not Specified"
+        },
+        "loan": {
+            "loan_amount": float(contract.loan_amount),
+            "interest_rate": float(contract.interest_rate),
+            "tenure_months": int(contract.tenure_months),
+            "emi_amount": float(contract.emi_amount),
+            "total_amount": float(contract.total_amount),
+            "amount_paid": float(contract.amount_paid),
+            "outstanding_amount": float(contract.outstanding_amount)
+        },
+        "payment_schedule": [
+            {
+                "installment_number": int(payment.installment_number),
+                "due_date": payment.due_date.strftime("%Y-%m-%d") if hasattr(payment.due_date, 'strftime') else str(payment.due_date),
+                "amount": float(payment.amount),
+                "status": payment.status.lower(),
+                "paid_date": payment.paid_date.strftime("%Y-%m-%d") if payment.paid_date and hasattr(payment.paid_date, 'strftime') else None
+            }
+            for payment in payment_schedule
+        ],
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+
+def write_json_array(f, items, compact=False):
+    """Write items as a JSON array one element at a time; returns the count"""
+    count = 0
+    f.write("[")
+    for item in items:
+        if compact:
+            f.write("," if count else "")
+            f.write(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+        else:
+            f.write(",\n" if count else "\n")
+            f.write(textwrap.indent(json.dumps(item, indent=2, ensure_ascii=False), "  "))
+        count += 1
+    f.write("\n]" if count and not compact else "]")
+    return count
 
 
 def convert_data():
@@ -156,28 +352,24 @@ def convert_data():
             print("⚠ No contracts found. Exiting.")
             return False
         
-        # Get all IDs
-        customer_ids = [str(row.customer_id) for row in contracts_rows]
-        guarantor_ids = [str(row.guarantor_id) for row in contracts_rows]
-        vehicle_ids = [str(row.vehicle_id) for row in contracts_rows]
-        contract_ids = [str(row.contract_id) for row in contracts_rows]
+        # Get all IDs (duplicates are dropped by fetch_related)
+        customer_ids = [row.customer_id for row in contracts_rows]
+        guarantor_ids = [row.guarantor_id for row in contracts_rows]
+        vehicle_ids = [row.vehicle_id for row in contracts_rows]
+        contract_ids = [row.contract_id for row in contracts_rows]
         
         # Fetch related data
         print("📥 Fetching customers...")
-        cursor.execute(CUSTOMERS_QUERY.format(','.join(customer_ids)))
-        customers = {row.customer_id: row for row in cursor.fetchall()}
+        customers = {row.customer_id: row for row in fetch_related(CUSTOMERS_QUERY, customer_ids)}
         
         print("📥 Fetching guarantors...")
-        cursor.execute(GUARANTORS_QUERY.format(','.join(guarantor_ids)))
-        guarantors = {row.guarantor_id: row for row in cursor.fetchall()}
+        guarantors = {row.guarantor_id: row for row in fetch_related(GUARANTORS_QUERY, guarantor_ids)}
         
         print("📥 Fetching vehicles...")
-        cursor.execute(VEHICLES_QUERY.format(','.join(vehicle_ids)))
-        vehicles = {row.vehicle_id: row for row in cursor.fetchall()}
+        vehicles = {row.vehicle_id: row for row in fetch_related(VEHICLES_QUERY, vehicle_ids)}
         
         print("📥 Fetching payment schedules...")
-        cursor.execute(PAYMENTS_QUERY.format(','.join(contract_ids)))
-        payments_rows = cursor.fetchall()
+        payments_rows = fetch_related(PAYMENTS_QUERY, contract_ids)
         
         # Organize payments by contract
         payments = {}
@@ -186,77 +378,38 @@ def convert_data():
                 payments[payment.contract_id] = []
             payments[payment.contract_id].append(payment)
         
-        # Build JSON structure
-        print("\n🔄 Converting to mobile format...")
-        contracts_data = []
+        photo_paths = (
+            [getattr(row, 'photo_path', None) for row in customers.values()] +
+            [getattr(row, 'photo_path', None) for row in guarantors.values()]
+        )
+        prepare_photos(photo_paths)
         
-        for contract in contracts_rows:
-            customer = customers.get(contract.customer_id)
-            guarantor = guarantors.get(contract.guarantor_id)
-            vehicle = vehicles.get(contract.vehicle_id)
-            payment_schedule = payments.get(contract.contract_id, [])
-            
-            if not all([customer, guarantor, vehicle]):
-                print(f"⚠ Skipping contract {contract.contract_number} - missing related data")
-                continue
-            
-            contract_data = {
-                "id": str(contract.contract_id),
-                "contract_number": contract.contract_number,
-                "contract_date": contract.contract_date.strftime("%Y-%m-%d") if hasattr(contract.contract_date, 'strftime') else str(contract.contract_date),
-                "status": contract.status.lower(),
-                "company_name": contract.company_name or "Vehicle Finance Ltd",
-                "customer": {
-                    "name": customer.customer_name,
-                    "phone": customer.phone or "",
-                    "address": customer.address or "",
-                    "photo": image_to_base64(customer.photo_path if hasattr(customer, 'photo_path') else None)
-                },
-                "guarantor": {
-                    "name": guarantor.guarantor_name,
-                    "phone": guarantor.phone or "",
-                    "address": guarantor.address or "",
-                    "relation": guarantor.relation or "Guarantor",
-                    "photo": image_to_base64(guarantor.photo_path if hasattr(guarantor, 'photo_path') else None)
-                },
-                "vehicle": {
-                    "make": vehicle.make,
-                    "model": vehicle.model,
-                    "year": int(vehicle.year),
-                    "registration_number": vehicle.registration_number,
-                    "vin": vehicle.vin or "",
-                    "color": vehicle.color or "Not Specified"
-                },
-                "loan": {
-                    "loan_amount": float(contract.loan_amount),
-                    "interest_rate": float(contract.interest_rate),
-                    "tenure_months": int(contract.tenure_months),
-                    "emi_amount": float(contract.emi_amount),
-                    "total_amount": float(contract.total_amount),
-                    "amount_paid": float(contract.amount_paid),
-                    "outstanding_amount": float(contract.outstanding_amount)
-                },
-                "payment_schedule": [
-                    {
-                        "installment_number": int(payment.installment_number),
-                        "due_date": payment.due_date.strftime("%Y-%m-%d") if hasattr(payment.due_date, 'strftime') else str(payment.due_date),
-                        "amount": float(payment.amount),
-                        "status": payment.status.lower(),
-                        "paid_date": payment.paid_date.strftime("%Y-%m-%d") if payment.paid_date and hasattr(payment.paid_date, 'strftime') else None
-                    }
-                    for payment in payment_schedule
-                ],
-                "created_at": datetime.utcnow().isoformat()
-            }
-            
-            contracts_data.append(contract_data)
+        print("📥 Loading photos...")
+        photos = PhotoLoader()
+        photos.prefetch(photo_paths)
         
-        # Save to JSON file
-        print(f"\n💾 Saving to {OUTPUT_FILE}...")
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(contracts_data, f, indent=2, ensure_ascii=False)
+        def iter_contracts():
+            for contract in contracts_rows:
+                customer = customers.get(contract.customer_id)
+                guarantor = guarantors.get(contract.guarantor_id)
+                vehicle = vehicles.get(contract.vehicle_id)
+                payment_schedule = payments.get(contract.contract_id, [])
+                
+                if not all([customer, guarantor, vehicle]):
+                    print(f"⚠ Skipping contract {contract.contract_number} - missing related data")
+                    continue
+                
+                yield build_contract(contract, customer, guarantor, vehicle, payment_schedule, photos)
+        
+        # Convert and save together: each contract is written as soon as it is built
+        print("\n🔄 Converting to mobile format...")
+        print(f"💾 Saving to {OUTPUT_FILE}...")
+        with open(OUTPUT_FILE + '.tmp', 'w', encoding='utf-8') as f:
+            converted = write_json_array(f, iter_contracts(), COMPACT_OUTPUT)
+        os.replace(OUTPUT_FILE + '.tmp', OUTPUT_FILE)
+        print(photos.report())
         
-        print(f"\n✅ SUCCESS! Converted {len(contracts_data)} contracts")
+        print(f"\n✅ SUCCESS! Converted {converted} contracts")
         print(f"\n📱 Next steps:")
         print(f"1. Copy '{OUTPUT_FILE}' to your Android mobile")
         print(f"2. Open the Vehicle Finance mobile app")
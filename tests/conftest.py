@@ -0,0 +1,49 @@
+"""
+Shared test setup.
+
+backend/ goes on sys.path so tests import its modules the way the server
+does. Tests that need MongoDB run against an in-memory mongomock-motor
+database and are skipped where it is not installed.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+# server.py reads these at import; nothing connects until a query is sent
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+
+# Motor binds server.py's photo bucket to the current event loop at import,
+# which fails once a test has run asyncio.run, so import it up front
+import server  # noqa: E402,F401
+
+
+@pytest.fixture
+def db(request):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    # Clients share one in-memory server, so every test gets its own database
+    return mongomock_motor.AsyncMongoMockClient()[request.node.name]
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    """httpx client for the app, served from ``db``, with a valid token"""
+    import httpx
+
+    from response_cache import DataVersion
+    from token_cache import TokenCache
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "photo_bucket", None)
+    monkeypatch.setattr(server, "data_version", DataVersion(db.meta, 0.0))
+    # Tokens made in the same second are identical; one test's logout must
+    # not revoke the next test's token
+    monkeypatch.setattr(server, "token_cache", TokenCache())
+    server.response_cache.clear()
+    token = server.create_access_token({"sub": "admin"})
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test",
+                             headers={"Authorization": f"Bearer {token}"})
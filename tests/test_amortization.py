@@ -0,0 +1,96 @@
+"""
+amortization.py against a Decimal reference.
+
+The reference walks each loan month by month in exact decimal arithmetic
+with the documented rounding rules: EMI and each month's interest are
+rounded half up to the paisa, and the last instalment clears whatever
+principal is left.
+"""
+
+import os
+import sys
+from decimal import ROUND_HALF_UP, Decimal, localcontext
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from amortization import amortize, schedule_rows, schedules  # noqa: E402
+
+PAISA = Decimal("0.01")
+
+
+def reference_schedule(principal, rate, tenure):
+    """[(payment, principal, interest, balance)] in rupees, plus the EMI"""
+    with localcontext() as context:
+        context.prec = 50
+        principal = Decimal(str(principal)).quantize(PAISA, ROUND_HALF_UP)
+        monthly = Decimal(str(rate)).quantize(PAISA, ROUND_HALF_UP) / 1200
+        if monthly:
+            growth = (1 + monthly) ** tenure
+            emi = principal * monthly * growth / (growth - 1)
+        else:
+            emi = principal / tenure
+        emi = emi.quantize(PAISA, ROUND_HALF_UP)
+
+        rows = []
+        balance = principal
+        for month in range(1, tenure + 1):
+            interest = (balance * monthly).quantize(PAISA, ROUND_HALF_UP)
+            part = balance if month == tenure else min(emi - interest, balance)
+            balance -= part
+            rows.append((interest + part, part, interest, balance))
+    return emi, rows
+
+
+def random_book(size, seed):
+    rng = np.random.default_rng(seed)
+    principal = np.round(rng.uniform(10_000, 2_500_000, size), 2)
+    rate = np.round(rng.uniform(0, 24, size), 2)
+    rate[::17] = 0.0
+    tenure = rng.integers(1, 85, size)
+    return principal, rate, tenure
+
+
+def test_schedules_match_decimal_reference():
+    principal, rate, tenure = random_book(300, seed=1)
+    result = schedules(principal, rate, tenure)
+
+    for i in range(len(principal)):
+        emi, expected = reference_schedule(principal[i], rate[i], int(tenure[i]))
+        assert Decimal(str(result["emi"][i])) == emi
+        rows = schedule_rows(result, i, int(tenure[i]))
+        for row, (payment, part, interest, balance) in zip(rows, expected):
+            assert Decimal(str(row["interest"])) == interest
+            assert Decimal(str(row["principal"])) == part
+            assert Decimal(str(row["payment"])) == payment
+            assert Decimal(str(row["balance"])) == balance
+
+
+def test_amortize_totals_match_decimal_reference():
+    principal, rate, tenure = random_book(500, seed=2)
+    result = amortize(principal, rate, tenure)
+
+    for i in range(len(principal)):
+        emi, expected = reference_schedule(principal[i], rate[i], int(tenure[i]))
+        total_interest = sum(interest for _, _, interest, _ in expected)
+        assert Decimal(str(result["emi"][i])) == emi
+        assert Decimal(str(result["total_interest"][i])) == total_interest
+        assert Decimal(str(result["last_instalment"][i])) == expected[-1][0]
+        assert result["total_amount"][i] == pytest.approx(principal[i] + float(total_interest), abs=1e-6)
+
+
+def test_principal_repaid_exactly_and_caller_order_kept():
+    principal = np.array([100_000.0, 250_000.55, 99_999.99])
+    rate = np.array([12.0, 9.75, 0.0])
+    tenure = np.array([12, 60, 7])
+    result = schedules(principal, rate, tenure)
+
+    for i in range(len(principal)):
+        months = int(tenure[i])
+        paid = np.round(result["principal"][i, :months] * 100).astype(np.int64).sum()
+        assert paid == round(principal[i] * 100)
+        assert result["balance"][i, months - 1] == 0.0
+        # Cells past the tenure stay empty
+        assert not result["payment"][i, months:].any()
@@ -0,0 +1,98 @@
+"""arrears.py against a plain per-instalment loop."""
+
+import asyncio
+from datetime import date, datetime
+
+from arrears import TOLERANCE, ScheduleColumns, compute_arrears, instalment_values, refresh_arrears
+from synthetic import generate_batch
+
+AS_OF = date(2024, 1, 1)
+
+EDGE_CASES = [
+    # Seed-data shape, overpaid, undated and unreadable rows
+    {"id": "edge-1", "payment_schedule": [
+        {"installment_number": 1, "due_date": "2023-10-05", "amount": 1000.0, "status": "pending"},
+        {"installment_number": 2, "due_date": "2023-11-05", "amount": 1000.0, "status": "paid"},
+        {"installment_number": 3, "due_date": "2024-01-05", "amount": 1000.0, "status": "pending"},
+    ]},
+    {"id": "edge-2", "payment_schedule": [
+        {"sno": 1, "emi_amount": 500.0, "due_date": "01-Dec-2023", "payment_received": 600.0},
+        {"sno": 2, "emi_amount": 500.0, "due_date": "", "payment_received": 0.0},
+        {"sno": 3, "emi_amount": 500.0, "due_date": "not a date", "payment_received": 0.0},
+        {"sno": 4, "emi_amount": 500.0, "due_date": "31-Dec-2023", "payment_received": 499.999},
+        {"sno": 5, "emi_amount": 500.0, "due_date": "01-Jan-2024", "payment_received": 0.0},
+    ]},
+    {"id": "edge-3", "payment_schedule": []},
+]
+
+
+def book():
+    contracts = [{"id": c["_id"], "payment_schedule": c["payment_schedule"]}
+                 for c in generate_batch(0, 300, 7, AS_OF)]
+    return contracts + EDGE_CASES
+
+
+def parse(value):
+    for fmt in ("%d-%b-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def reference(contract):
+    """(dpd, overdue amount, overdue instalments, bucket) one row at a time"""
+    dpd, amount, count = 0, 0.0, 0
+    for row in contract["payment_schedule"]:
+        due, emi, received = instalment_values(row)
+        due = parse(due)
+        if due is None or due >= AS_OF or emi - received <= TOLERANCE:
+            continue
+        dpd = max(dpd, (AS_OF - due).days)
+        amount += emi - received
+        count += 1
+    bucket = ("current" if dpd == 0 else "1-30" if dpd <= 30 else "31-60" if dpd <= 60
+              else "61-90" if dpd <= 90 else "90+")
+    return dpd, round(amount, 2), count, bucket
+
+
+def test_compute_arrears_matches_loop():
+    contracts = book()
+    columns = ScheduleColumns()
+    for contract in contracts:
+        columns.add(contract["id"], contract["payment_schedule"])
+    results = compute_arrears(*columns.arrays(), len(contracts), AS_OF)
+
+    buckets = set()
+    for i, contract in enumerate(contracts):
+        dpd, amount, count, bucket = reference(contract)
+        assert results["dpd"][i] == dpd, contract["id"]
+        assert abs(results["overdue_amount"][i] - amount) < 0.011, contract["id"]
+        assert results["overdue_instalments"][i] == count, contract["id"]
+        assert results["bucket"][i] == bucket, contract["id"]
+        buckets.add(bucket)
+    assert buckets == {"current", "1-30", "31-60", "61-90", "90+"}
+
+
+def test_refresh_in_chunks_and_by_id(db):
+    contracts = book()
+
+    async def scenario():
+        await db.contracts.insert_many([dict(contract) for contract in contracts])
+        stats = await refresh_arrears(db, AS_OF, chunk_size=70)
+        assert stats["contracts"] == stats["written"] == len(contracts)
+        stored = {c["id"]: c["arrears"] for c in await db.contracts.find({}, {"id": 1, "arrears": 1}).to_list(None)}
+        for contract in contracts:
+            dpd, _, count, bucket = reference(contract)
+            arrears = stored[contract["id"]]
+            assert (arrears["dpd"], arrears["overdue_instalments"], arrears["bucket"]) == (dpd, count, bucket)
+            assert arrears["as_of"] == AS_OF.isoformat()
+
+        # A same-day rerun writes nothing; ids limits the refresh
+        assert (await refresh_arrears(db, AS_OF, chunk_size=70))["written"] == 0
+        stats = await refresh_arrears(db, date(2024, 3, 1), ids=["edge-1", "edge-2"])
+        assert (stats["contracts"], stats["written"]) == (2, 2)
+        assert (await db.contracts.find_one({"id": "1"}))["arrears"]["as_of"] == AS_OF.isoformat()
+
+    asyncio.run(scenario())
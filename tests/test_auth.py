@@ -0,0 +1,31 @@
+"""Logout and the verified token cache."""
+
+import asyncio
+import time
+
+import jwt
+
+import server
+
+
+def test_logout_of_token_expired_since_it_was_cached(api):
+    token = jwt.encode({"sub": "admin", "exp": int(time.time()) - 5}, server.SECRET_KEY, algorithm=server.ALGORITHM)
+    # Cached while it was still valid
+    server.token_cache.put(token, "admin", time.time() + 60)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def logout():
+        async with api:
+            return await api.post("/api/auth/logout", headers=headers)
+
+    assert asyncio.run(logout()).status_code == 200
+    assert server.token_cache.get(token) is None
+
+
+def test_logged_out_token_is_refused(api):
+    async def scenario():
+        async with api:
+            assert (await api.post("/api/auth/logout")).status_code == 200
+            return await api.get("/api/auth/cache-stats")
+
+    assert asyncio.run(scenario()).status_code == 401
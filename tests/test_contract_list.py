@@ -0,0 +1,91 @@
+"""GET /api/contracts: keyset pagination over every sort and filter."""
+
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from arrears import refresh_arrears
+from importer import prepare_contract
+from server import CONTRACT_SORTS, get_path
+from synthetic import generate_batch
+
+AS_OF = date(2024, 1, 1)
+PAGE = 7
+
+
+async def load_book(db, size=60):
+    contracts = [await prepare_contract(contract) for contract in generate_batch(0, size, 3, AS_OF)]
+    for contract in contracts:
+        # Ledger and followups are not part of list responses
+        contract.pop("ledger")
+        contract.pop("followup")
+    await db.contracts.insert_many(contracts)
+    await refresh_arrears(db, AS_OF)
+    return await db.contracts.find({}, {"_id": 0}).to_list(None)
+
+
+def expected_ids(contracts, sort_by, keep=lambda contract: True):
+    field, direction = CONTRACT_SORTS[sort_by]
+    ordered = sorted((c for c in contracts if keep(c)), key=lambda c: (get_path(c, field), c["id"]),
+                     reverse=direction < 0)
+    return [c["id"] for c in ordered]
+
+
+async def all_pages(api, params):
+    ids, after, pages = [], None, 0
+    while True:
+        response = await api.get("/api/contracts", params={**params, "limit": PAGE,
+                                                           **({"after": after} if after else {})})
+        assert response.status_code == 200
+        page = response.json()
+        pages += 1
+        ids += [item["id"] for item in page]
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            return ids, pages
+        assert len(page) == PAGE
+
+
+@pytest.mark.parametrize("sort_by", list(CONTRACT_SORTS))
+def test_pages_follow_sort_order_without_gaps(api, db, sort_by):
+    async def scenario():
+        async with api:
+            contracts = await load_book(db)
+            return contracts, await all_pages(api, {"sort_by": sort_by})
+
+    contracts, (ids, pages) = asyncio.run(scenario())
+    assert ids == expected_ids(contracts, sort_by)
+    assert pages == -(-len(contracts) // PAGE)
+
+
+def test_filters_apply_on_every_page(api, db):
+    async def scenario():
+        async with api:
+            contracts = await load_book(db)
+            live = await all_pages(api, {"status_filter": "Live", "sort_by": "customer"})
+            overdue = await all_pages(api, {"min_dpd": 1, "sort_by": "dpd"})
+            return contracts, live[0], overdue[0]
+
+    contracts, live, overdue = asyncio.run(scenario())
+    assert live == expected_ids(contracts, "customer", lambda c: c["status"] == "Live")
+    assert overdue == expected_ids(contracts, "dpd", lambda c: c["arrears"]["dpd"] >= 1)
+    assert overdue
+
+
+def test_date_sort_is_chronological_not_lexicographic(api, db):
+    async def scenario():
+        async with api:
+            await load_book(db)
+            return (await api.get("/api/contracts", params={"sort_by": "date", "limit": 100})).json()
+
+    dates = [datetime.strptime(item["contract_date"], "%d-%b-%Y") for item in asyncio.run(scenario())]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_invalid_cursor_is_rejected(api, db):
+    async def fetch():
+        async with api:
+            return await api.get("/api/contracts", params={"after": "not-a-cursor"})
+
+    assert asyncio.run(fetch()).status_code == 400
@@ -0,0 +1,89 @@
+"""Import pipeline: staging promote and rollback."""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from importer import (ImportValidationError, begin_staging, insert_staged, prepare_contract, promote_staging,
+                      rollback_import)
+from synthetic import generate_batch
+
+AS_OF = date(2024, 1, 1)
+
+
+def book(start, size):
+    return generate_batch(start, size, 42, AS_OF)
+
+
+async def load(db, contracts):
+    await begin_staging(db)
+    await insert_staged(db, [await prepare_contract(contract) for contract in contracts])
+    return await promote_staging(db, len(contracts))
+
+
+async def ids(db, collection):
+    key = "id" if collection.startswith("contracts") else "contract_id"
+    return sorted(set(await db[collection].distinct(key)))
+
+
+def test_promote_swaps_every_collection_and_keeps_previous(db):
+    async def scenario():
+        await load(db, book(0, 3))
+        await load(db, book(10, 2))
+        names = await db.list_collection_names()
+        assert not [name for name in names if name.endswith("_staging")]
+        for collection in ("contracts", "ledger"):
+            assert await ids(db, collection) == ["11", "12"]
+            assert await ids(db, collection + "_previous") == ["1", "2", "3"]
+
+    asyncio.run(scenario())
+
+
+def test_rollback_restores_previous_book(db):
+    async def scenario():
+        await load(db, book(0, 3))
+        await load(db, book(10, 2))
+        assert await rollback_import(db) == 3
+        for collection in ("contracts", "ledger"):
+            assert await ids(db, collection) == ["1", "2", "3"]
+
+    asyncio.run(scenario())
+
+
+def test_count_mismatch_leaves_live_book(db):
+    async def scenario():
+        await load(db, book(0, 3))
+        await begin_staging(db)
+        await insert_staged(db, [await prepare_contract(contract) for contract in book(10, 2)])
+        with pytest.raises(ImportValidationError):
+            await promote_staging(db, 5)
+        assert await ids(db, "contracts") == ["1", "2", "3"]
+
+    asyncio.run(scenario())
+
+
+def test_rollback_without_previous_import(db):
+    with pytest.raises(ImportValidationError):
+        asyncio.run(rollback_import(db))
+
+
+def test_failed_swap_restores_live_book(db, monkeypatch):
+    collection_type = type(db.contracts)
+    rename = collection_type.rename
+
+    async def failing_rename(self, new_name, *args, **kwargs):
+        if self.name == "contracts_staging":
+            raise RuntimeError("rename failed")
+        return await rename(self, new_name, *args, **kwargs)
+
+    async def scenario():
+        await load(db, book(0, 3))
+        monkeypatch.setattr(collection_type, "rename", failing_rename)
+        with pytest.raises(RuntimeError):
+            await load(db, book(10, 2))
+        for collection in ("contracts", "ledger"):
+            assert await ids(db, collection) == ["1", "2", "3"]
+            assert await ids(db, collection + "_staging") == ["11", "12"]
+
+    asyncio.run(scenario())
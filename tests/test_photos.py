@@ -0,0 +1,23 @@
+"""GET /api/photos/{hash}: conditional requests."""
+
+import asyncio
+
+import pytest
+
+PHOTO_HASH = "ab" * 32
+
+
+@pytest.mark.parametrize("if_none_match", [
+    f'"{PHOTO_HASH}"',
+    f'W/"{PHOTO_HASH}"',
+    f'"other", "{PHOTO_HASH}"',
+    "*",
+])
+def test_matching_validator_is_not_modified(api, if_none_match):
+    async def fetch():
+        async with api:
+            return await api.get(f"/api/photos/{PHOTO_HASH}", headers={"If-None-Match": if_none_match})
+
+    response = asyncio.run(fetch())
+    assert response.status_code == 304
+    assert response.headers["ETag"] == f'"{PHOTO_HASH}"'
@@ -0,0 +1,50 @@
+"""ResponseCache: bounded by the bytes of raw and compressed bodies."""
+
+from response_cache import ResponseCache
+
+
+def halve(body, encoding):
+    return body[:len(body) // 2]
+
+
+def test_bounded_by_bytes_least_recently_used_first():
+    cache = ResponseCache(max_bytes=1000)
+    for key in "abc":
+        cache.put(key, b"x" * 300)
+    assert cache.get("a") is not None
+    cache.put("d", b"x" * 300)
+    # b was least recently used
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.bytes == 900
+
+
+def test_compressed_bodies_count_towards_the_bound():
+    cache = ResponseCache(max_bytes=1000)
+    first = cache.put("a", b"x" * 400)
+    cache.put("b", b"x" * 400)
+    first.encoded("gzip", halve)
+    first.encoded("gzip", halve)
+    assert cache.bytes == 1000
+    cache.get("a")
+    cache.get("b").encoded("br", halve)
+    assert cache.get("a") is None
+    assert cache.bytes == 600
+
+
+def test_oversized_body_is_served_but_not_kept():
+    cache = ResponseCache(max_bytes=100)
+    entry = cache.put("big", b"x" * 101)
+    assert entry.body == b"x" * 101
+    assert cache.get("big") is None
+    assert cache.bytes == 0
+
+
+def test_replacing_and_clearing_release_bytes():
+    cache = ResponseCache(max_bytes=1000)
+    old = cache.put("a", b"x" * 500)
+    cache.put("a", b"x" * 200)
+    old.encoded("gzip", halve)
+    assert cache.bytes == 200
+    cache.clear()
+    assert cache.bytes == 0
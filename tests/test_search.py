@@ -0,0 +1,81 @@
+"""Search tokens: word prefixes, identifier substrings, all words required."""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from importer import prepare_contract
+from search import query_tokens, search_filter, search_tokens
+from synthetic import generate_batch
+
+CONTRACT = {
+    "contract_number": "AF/2023/0001234",
+    "file_number": "F-77",
+    "customer_name": "Mr. Rajesh Kumar",
+    "customer": {"name": "Mr. Rajesh Kumar"},
+    "vehicle": {"make": "Maruti Suzuki", "model": "Swift", "registration_number": "TN-09 AB 4321"},
+    "vehicle_number": "TN09AB4321",
+}
+
+
+def matches(contract: dict, search: str) -> bool:
+    return set(query_tokens(search)) <= set(search_tokens(contract))
+
+
+@pytest.mark.parametrize("search", [
+    "raj", "RAJESH", "kum", "rajesh kumar", "kumar raj", "swi", "maruti swift",
+    "4321", "ab43", "tn09", "tn-09 ab", "0001234", "2023", "f77",
+])
+def test_matches(search):
+    assert matches(CONTRACT, search)
+
+
+@pytest.mark.parametrize("search", [
+    "esh",  # names match from the start of a word only
+    "rajesh sharma",  # every word must match
+    "4322", "honda", "tn10",
+])
+def test_does_not_match(search):
+    assert not matches(CONTRACT, search)
+
+
+def test_blank_search_filters_nothing():
+    assert search_filter("  ,. ") == {}
+
+
+def test_search_endpoint_uses_tokens(api, db):
+    others = [
+        {**CONTRACT, "id": "2", "customer": {"name": "Priya Rajan"}, "customer_name": "Priya Rajan",
+         "vehicle_number": "KA01ZZ1111", "vehicle": {**CONTRACT["vehicle"], "registration_number": "KA01ZZ1111"}},
+        {**CONTRACT, "id": "3", "customer": {"name": "Raj"}, "customer_name": "Raj"},
+    ]
+
+    async def scenario():
+        documents = [{**contract, "id": contract.get("id", "1"), "status": "Live", "contract_date": "01-Jan-2024",
+                      "loan": {"outstanding_amount": 1.0, "emi_amount": 1.0}}
+                     for contract in [CONTRACT] + others]
+        for document in documents:
+            document.update(search_tokens=search_tokens(document))
+        await db.contracts.insert_many(documents)
+        async with api:
+            async def ids(**params):
+                response = await api.get("/api/contracts", params=params)
+                assert response.status_code == 200
+                return [item["id"] for item in response.json()]
+
+            return [await ids(search=search) for search in ("raj", "rajesh", "ka01", "jesh")]
+
+    raj, rajesh, registration, inside = asyncio.run(scenario())
+    assert sorted(raj) == ["1", "2", "3"]
+    assert sorted(rajesh) == ["1"]
+    assert registration == ["2"]
+    assert inside == []
+
+
+def test_imported_contracts_get_tokens():
+    contract = generate_batch(0, 1, 42, date(2024, 1, 1))[0]
+    prepared = asyncio.run(prepare_contract(contract))
+    first, last = prepared["customer"]["name"].split()[-2:]
+    search = f"{first[:3]} {last} {prepared['vehicle']['model']} {prepared['vehicle_number'][-4:]}"
+    assert set(query_tokens(search)) <= set(prepared["search_tokens"])
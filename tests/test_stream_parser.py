@@ -0,0 +1,75 @@
+"""importer.iter_json_documents: every body form, however it is chunked."""
+
+import asyncio
+import json
+
+import pytest
+
+import importer
+from importer import ImportFormatError, iter_json_documents
+
+CONTRACTS = [
+    {"id": "1", "customer": {"name": "Rāma {x}", "photo": None}, "payment_schedule": [{"sno": 1}]},
+    {"id": "2", "note": "quote \" and ] and }", "amounts": [1.5, 2, -3e2]},
+    {"id": "3"},
+]
+
+
+def parse(body: bytes, chunk_size: int) -> list:
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    async def collect():
+        return [document async for document in iter_json_documents(chunks())]
+
+    return asyncio.run(collect())
+
+
+BODIES = {
+    "ndjson": "\n".join(json.dumps(c) for c in CONTRACTS) + "\n",
+    "array": json.dumps(CONTRACTS, indent=2),
+    "wrapper": json.dumps({"contracts": CONTRACTS}),
+    "wrapper with other keys": json.dumps({"generated": "2024-01-01", "meta": {"contracts": 3, "x": [1, "]"]},
+                                           "contracts": CONTRACTS, "count": 3}),
+}
+
+
+@pytest.mark.parametrize("form", BODIES)
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_every_form_and_chunking(form, chunk_size):
+    assert parse(BODIES[form].encode(), chunk_size) == CONTRACTS
+
+
+@pytest.mark.parametrize("body", ["", "  \n", "[]", '{"contracts": []}', '{"source": "x", "contracts": []}'])
+def test_empty_bodies(body):
+    assert parse(body.encode(), 3) == []
+
+
+@pytest.mark.parametrize("body", [
+    '{"contracts": {"id": "1"}}',
+    '{"contracts": [{"id": "1"}], "more": ',
+    '{"contracts": [{"id": "1"}] "x"',
+    '[{"id": "1"}, {"id": ',
+    '{"id": "1"}\n{"id": "2"',
+    '[1, 2]',
+    'contracts',
+])
+def test_malformed_bodies(body):
+    with pytest.raises(ImportFormatError):
+        parse(body.encode(), 4)
+
+
+def test_large_document_is_not_reparsed_per_chunk(monkeypatch):
+    calls = []
+    drain = importer._drain
+
+    def counting_drain(buffer, documents):
+        calls.append(len(buffer))
+        return drain(buffer, documents)
+
+    monkeypatch.setattr(importer, "_drain", counting_drain)
+    contract = {"id": "1", "photo": "A" * 4_000_000}
+    assert parse(json.dumps(contract).encode(), 4096) == [contract]
+    # About 1000 chunks; retries only when the buffer doubles
+    assert len(calls) < 30
@@ -0,0 +1,31 @@
+"""Synthetic book: the same seed and as-of date give the same book."""
+
+import asyncio
+from datetime import date
+
+from synthetic import BLOCK_SIZE, generate_batch
+
+AS_OF = date(2024, 1, 1)
+
+
+def test_batch_size_does_not_change_book():
+    start = BLOCK_SIZE - 7
+    whole = generate_batch(start, 20, 42, AS_OF)
+    assert whole == generate_batch(start, 5, 42, AS_OF) + generate_batch(start + 5, 15, 42, AS_OF)
+    assert [c["_id"] for c in whole] == [str(start + i + 1) for i in range(20)]
+
+
+def test_seed_ages_book_as_of_requested_date(api, db):
+    async def seed():
+        response = await api.post("/api/seed-data", params={"count": 60, "as_of": AS_OF.isoformat()})
+        assert response.status_code == 200
+        assert response.json()["as_of"] == AS_OF.isoformat()
+        return await db.contracts.find({}, {"_id": 0, "id": 1, "arrears": 1}).sort("id", 1).to_list(None)
+
+    async def scenario():
+        async with api:
+            return await seed(), await seed()
+
+    first, second = asyncio.run(scenario())
+    assert {c["arrears"]["as_of"] for c in first} == {AS_OF.isoformat()}
+    assert second == first
@@ -0,0 +1,146 @@
+"""
+AnjaarFinance Photo Pipeline
+Makes a small thumbnail and a medium preview of every referenced photo.
+Encoding is spread over a process pool; results are cached by source
+mtime/size and content hash so unchanged photos are never reprocessed.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# name -> (width, height, crop). Thumbnails are cropped square avatars,
+# previews keep their aspect ratio inside the box.
+SIZES = {
+    "thumb":   (96, 96, True),
+    "preview": (480, 480, False),
+}
+
+JPEG_QUALITY = 80
+MANIFEST_FILE = "photo_cache.json"
+
+
+def output_name(source_path, size_name):
+    """cust/A123.jpg -> A123_1f2e3d4c_thumb.jpg
+
+    The hash of the full source path keeps photos that share a file name
+    in different folders (cust/101.jpg, guar/101.jpg) apart.
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    key = os.path.normcase(os.path.abspath(source_path))
+    path_hash = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+    return f"{stem}_{path_hash}_{size_name}.jpg"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def render(source_path, out_dir):
+    """Encode every size for one photo. Runs in a worker process."""
+    outputs = {}
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for size_name, (width, height, crop) in SIZES.items():
+            if crop:
+                resized = ImageOps.fit(img, (width, height), Image.LANCZOS)
+            else:
+                resized = img.copy()
+                resized.thumbnail((width, height), Image.LANCZOS)
+            target = os.path.join(out_dir, output_name(source_path, size_name))
+            resized.save(target, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            outputs[size_name] = os.path.basename(target)
+    return outputs
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def _outputs_exist(out_dir, path, entry):
+    """Whether entry's outputs are on disk under the names path renders to now"""
+    outputs = entry.get("outputs", {})
+    # Entries from before output names carried the path hash are redone
+    if outputs != {size_name: output_name(path, size_name) for size_name in SIZES}:
+        return False
+    return all(os.path.exists(os.path.join(out_dir, name)) for name in outputs.values())
+
+
+def process_photos(source_paths, out_dir, workers=None):
+    """Make thumbnails and previews for source_paths inside out_dir.
+
+    Returns {"rendered": n, "cached": n, "missing": n, "failed": n} and a
+    {source_path: {size_name: filename}} map.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    stats    = {"rendered": 0, "cached": 0, "missing": 0, "failed": 0}
+    results  = {}
+    todo     = {}
+
+    for path in sorted(set(p for p in source_paths if p)):
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            stats["missing"] += 1
+            continue
+
+        entry = manifest.get(key)
+        if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size and _outputs_exist(out_dir, path, entry):
+            stats["cached"] += 1
+            results[path] = entry["outputs"]
+            continue
+
+        # Touched but identical content (e.g. copied again): keep the old output
+        digest = file_hash(path)
+        if entry and entry["sha256"] == digest and _outputs_exist(out_dir, path, entry):
+            entry.update(mtime=st.st_mtime, size=st.st_size)
+            stats["cached"] += 1
+            results[path] = entry["outputs"]
+            continue
+
+        todo[path] = {"mtime": st.st_mtime, "size": st.st_size, "sha256": digest}
+
+    if todo:
+        if not PIL_AVAILABLE:
+            raise RuntimeError("Pillow not installed. Run: py -m pip install Pillow")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render, path, out_dir): path for path in todo}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    outputs = future.result()
+                except Exception as e:
+                    print(f"    Could not process {path}: {e}")
+                    stats["failed"] += 1
+                    continue
+                manifest[os.path.abspath(path)] = {**todo[path], "outputs": outputs}
+                results[path] = outputs
+                stats["rendered"] += 1
+
+    save_manifest(out_dir, manifest)
+    return stats, results
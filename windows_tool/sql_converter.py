@@ -4,6 +4,16 @@ Complete rewrite with Ledger, CollFollow, Photos support
 """
 
 import json
+import os
+import queue
+import sys
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+
+from photo_pipeline import process_photos
 from datetime import datetime, date
 import traceback
 
@@ -77,294 +87,647 @@ def connect_to_database(config):
             "Trusted_Connection=yes;"
             "TrustServerCertificate=yes;"
             "Encrypt=no;"
+            # The merge-join keeps four result sets open at once
+            "MARS_Connection=yes;"
         )
         return pyodbc.connect(conn_str)
     except Exception as e:
         print("Connection Error:", e)
         return None
 
-def execute_query(conn, query):
+def execute_query(conn, query, params=()):
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     columns = [col[0] for col in cursor.description]
     return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
+DEFAULT_ARRAYSIZE = 1000
+
+def iter_query(conn, query, params=(), arraysize=DEFAULT_ARRAYSIZE):
+    """Like execute_query, but yields rows arraysize at a time via fetchmany"""
+    cursor = conn.cursor()
+    cursor.arraysize = arraysize
+    cursor.execute(query, params)
+    columns = [col[0] for col in cursor.description]
+    try:
+        while True:
+            rows = cursor.fetchmany(arraysize)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        cursor.close()
+
+class SourceOrderError(RuntimeError):
+    """A source query returned FnCodes out of the order the merge-join expects"""
+
+def _check_order(previous, code, what):
+    # SQL Server sorts by the column's collation, Python by value; if the
+    # two ever disagree the merge-join would skip rows, so stop instead
+    if previous is not None and code < previous:
+        raise SourceOrderError(
+            f"{what} returned FnCode {code!r} after {previous!r}; the SQL Server "
+            f"ORDER BY does not match Python ordering of FnCode values")
+
+def group_by_fn_code(rows, what="query"):
+    """Yield (FnCode, [rows]) from rows already ordered by FnCode"""
+    current, group = None, []
+    for row in rows:
+        code = row["FnCode"]
+        if group and code != current:
+            _check_order(current, code, what)
+            yield current, group
+            group = []
+        current = code
+        group.append(row)
+    if group:
+        yield current, group
+
+class ChildRows:
+    """One FnCode-ordered child stream consumed in step with the contracts"""
+
+    def __init__(self, rows, what="child query"):
+        self._what   = what
+        self._groups = group_by_fn_code(rows, what)
+        self._next   = next(self._groups, None)
+        self._last   = None
+
+    def take(self, fn_code):
+        """Rows for fn_code; skips orphan groups that sort before it"""
+        _check_order(self._last, fn_code, "contracts query")
+        self._last = fn_code
+        while self._next is not None and self._next[0] < fn_code:
+            self._next = next(self._groups, None)
+        if self._next is not None and self._next[0] == fn_code:
+            rows = self._next[1]
+            self._next = next(self._groups, None)
+            return rows
+        return []
+
 
 # ══════════════════════════════════════
-# MAIN DATA BUILDER
+# SOURCE QUERIES
 # ══════════════════════════════════════
+# {scope} is replaced by an extra "AND FnCode IN (...)" filter for
+# incremental runs, or by nothing for a full export. ORDER BY lives
+# outside so the same text can be wrapped in a checksum query.
+
+CONTRACTS_QUERY = """
+    SELECT
+        a.CoCode, a.FlCode, a.FnCode, a.FnName, a.FnRefNo,
+        a.FnRegistration, a.FnGr1Code, a.FnArtCode, a.FnChassis,
+        a.FnEngine, a.FnModel, a.FnColour, a.FnAgSeized, a.FnSettled,
+        a.FnAgDate,
+
+        b.CoName, b.CoAlias,
+
+        c.Title,   c.Father,
+        c.Address1, c.Address2, c.Address3, c.Address4, c.Address5,
+        c.Mobile, c.Mobile2, c.Mobile3,
+
+        d.Title    AS GTitle,   d.Father   AS GFather,
+        d.Address1 AS GAddress1, d.Address2 AS GAddress2,
+        d.Address3 AS GAddress3, d.Address4 AS GAddress4,
+        d.Address5 AS GAddress5, d.Mobile  AS GMobile,
+        d.Mobile2  AS GMobile2,  d.Mobile3  AS GMobile3,
+
+        e.AtName,
+
+        f.FnAmt08  AS LoanAmount,
+        f.FnFinRate,
+        f.FnPayable,
+        f.FnAgAmt  AS TotalAmount,
+
+        g.FnAgAmtPaid,
+        g.FnAgAmtDue
+
+    FROM FnAgreement a
+    LEFT JOIN GnCompanyM   b ON a.CoCode    = b.CoCode
+    LEFT JOIN GnCusFolio   c ON a.FlCode     = c.Code
+    LEFT JOIN GnCusFolio   d ON a.FnGr1Code  = d.Code
+    LEFT JOIN GnArticle    e ON a.FnArtCode  = e.AtCode
+    LEFT JOIN FnAgAmount   f ON a.FnCode     = f.FnCode
+    LEFT JOIN FnAgDues     g ON a.FnCode     = g.FnCode
+
+    WHERE a.FnSettled IN (1, 2)   -- 1=Closed, 2=Unsettled(Live/Seized)
+    {scope}
+"""
 
-def build_contract_data(conn):
-
-    # ── 1. MAIN CONTRACT QUERY (all 7 tables) ──
-    print("  Fetching contracts...")
-    contracts = execute_query(conn, """
-        SELECT
-            a.CoCode, a.FlCode, a.FnCode, a.FnName, a.FnRefNo,
-            a.FnRegistration, a.FnGr1Code, a.FnArtCode, a.FnChassis,
-            a.FnEngine, a.FnModel, a.FnColour, a.FnAgSeized, a.FnSettled,
-            a.FnAgDate,
-
-            b.CoName, b.CoAlias,
-
-            c.Title,   c.Father,
-            c.Address1, c.Address2, c.Address3, c.Address4, c.Address5,
-            c.Mobile, c.Mobile2, c.Mobile3,
-
-            d.Title    AS GTitle,   d.Father   AS GFather,
-            d.Address1 AS GAddress1, d.Address2 AS GAddress2,
-            d.Address3 AS GAddress3, d.Address4 AS GAddress4,
-            d.Address5 AS GAddress5, d.Mobile  AS GMobile,
-            d.Mobile2  AS GMobile2,  d.Mobile3  AS GMobile3,
-
-            e.AtName,
-
-            f.FnAmt08  AS LoanAmount,
-            f.FnFinRate,
-            f.FnPayable,
-            f.FnAgAmt  AS TotalAmount,
-
-            g.FnAgAmtPaid,
-            g.FnAgAmtDue
-
-        FROM FnAgreement a
-        LEFT JOIN GnCompanyM   b ON a.CoCode    = b.CoCode
-        LEFT JOIN GnCusFolio   c ON a.FlCode     = c.Code
-        LEFT JOIN GnCusFolio   d ON a.FnGr1Code  = d.Code
-        LEFT JOIN GnArticle    e ON a.FnArtCode  = e.AtCode
-        LEFT JOIN FnAgAmount   f ON a.FnCode     = f.FnCode
-        LEFT JOIN FnAgDues     g ON a.FnCode     = g.FnCode
-
-        WHERE a.FnSettled IN (1, 2)   -- 1=Closed, 2=Unsettled(Live/Seized)
-        ORDER BY a.FnCode
-    """)
-    print(f"    → {len(contracts)} contracts found")
-
-    # ── 2. PAYMENT SCHEDULE ──
-    print("  Fetching payment schedule...")
-    installments = execute_query(conn, """
-        SELECT * FROM FnAgInstalments
-        ORDER BY FnCode, SerialNo
-    """)
-    print(f"    → {len(installments)} instalments found")
-
-    # ── 3. LEDGER ──
-    print("  Fetching ledger entries...")
-    ledger_rows = execute_query(conn, """
-        SELECT
-            FnCode,
-            VoucherDt,
-            VoucherType,
-            VoucherNo,
-            VoucherAmnt,
-            DrCrFlag,
-            Narration1,
-            OverDue
-        FROM FnAgLedgers
-        WHERE DeleteFlag = 2
-          AND PostFlag IN (1, 2, 4)
-        ORDER BY VoucherDt, VoucherType, VoucherNo
-    """)
-    print(f"    → {len(ledger_rows)} ledger entries found")
-
-    # ── 4. COLLECTION FOLLOWUP ──
-    print("  Fetching collection followup...")
-    followup_rows = execute_query(conn, """
-        SELECT
-            FnCode,
-            FnSerials,
-            RunDate,
-            ContDate,
-            Remark01, Remark02, Remark03, Remark04, Remark05,
-            Remark06, Remark07, Remark08, Remark09, Remark10
-        FROM FnAgCollFollow
-        ORDER BY FnCode, FnSerials
-    """)
-    print(f"    → {len(followup_rows)} followup entries found")
-
-    # ── GROUP BY FnCode ──
-    inst_dict     = {}
-    ledger_dict   = {}
-    followup_dict = {}
-
-    for i in installments:
-        inst_dict.setdefault(i["FnCode"], []).append(i)
+INSTALMENTS_QUERY = """
+    SELECT * FROM FnAgInstalments
+    WHERE 1 = 1
+    {scope}
+"""
 
-    for l in ledger_rows:
-        ledger_dict.setdefault(l["FnCode"], []).append(l)
+LEDGER_QUERY = """
+    SELECT
+        FnCode,
+        VoucherDt,
+        VoucherType,
+        VoucherNo,
+        VoucherAmnt,
+        DrCrFlag,
+        Narration1,
+        OverDue
+    FROM FnAgLedgers
+    WHERE DeleteFlag = 2
+      AND PostFlag IN (1, 2, 4)
+    {scope}
+"""
+
+FOLLOWUP_QUERY = """
+    SELECT
+        FnCode,
+        FnSerials,
+        RunDate,
+        ContDate,
+        Remark01, Remark02, Remark03, Remark04, Remark05,
+        Remark06, Remark07, Remark08, Remark09, Remark10
+    FROM FnAgCollFollow
+    WHERE 1 = 1
+    {scope}
+"""
+
+# name -> (query, FnCode column, ORDER BY)
+SOURCE_QUERIES = {
+    "contracts":    (CONTRACTS_QUERY,   "a.FnCode", "ORDER BY a.FnCode"),
+    "installments": (INSTALMENTS_QUERY, "FnCode",   "ORDER BY FnCode, SerialNo"),
+    "ledger":       (LEDGER_QUERY,      "FnCode",   "ORDER BY FnCode, VoucherDt, VoucherType, VoucherNo"),
+    "followup":     (FOLLOWUP_QUERY,    "FnCode",   "ORDER BY FnCode, FnSerials"),
+}
+
+
+def source_query(name, fn_codes=None):
+    """SQL and parameters for one source table, optionally limited to fn_codes"""
+    query, code_column, order_by = SOURCE_QUERIES[name]
+    if fn_codes is None:
+        return query.format(scope="") + order_by, ()
+    scope = f"AND {code_column} IN (SELECT value FROM STRING_SPLIT(?, ','))"
+    return query.format(scope=scope) + order_by, (",".join(str(c) for c in fn_codes),)
 
+
+# ══════════════════════════════════════
+# MAIN DATA BUILDER
+# ══════════════════════════════════════
+
+def build_contract(c, installments, ledger_rows, followup_rows):
+    """Turn one FnAgreement row and its child rows into the app contract"""
+    fn_code    = c["FnCode"]
+    fl_code    = safe_str(c.get("FlCode"))
+    outstanding = safe_float(c.get("FnAgAmtDue"))
+    seized      = safe_int(c.get("FnAgSeized"))
+    fn_settled  = safe_int(c.get("FnSettled"))
+
+    # ── Status: FnSettled=1 = Closed, FnAgSeized=1 = Seized, else Live ──
+    if fn_settled == 1:
+        status = "Closed"
+    elif seized == 1:
+        status = "Seized"
+    else:
+        status = "Live"
+
+    # ── Photo: A{FlCode}.jpg for both borrower and guarantor ──
+    photo_filename = f"A{fl_code}.jpg" if fl_code else None
+
+    # ── Payment Schedule ──
+    payment_schedule = []
+    for inst in installments:
+        payment_schedule.append({
+            "sno":              safe_int(inst.get("SerialNo")),
+            "emi_amount":       safe_float(inst.get("DueAmount")),
+            "due_date":         format_date(inst.get("DueDate")),
+            "payment_received": safe_float(inst.get("DueAmountRcvd")),
+            "date_received":    format_date(inst.get("DueRcvdOn")),
+            "delay_days":       safe_int(inst.get("DiffDays")),
+        })
+
+    # ── Ledger ──
+    ledger = []
+    for l in ledger_rows:
+        # DrCrFlag: D = Debit, C = Credit
+        dr_cr   = safe_str(l.get("DrCrFlag")).upper()
+        amount  = safe_float(l.get("VoucherAmnt"))
+        debit   = amount if dr_cr == "D" else 0.0
+        credit  = amount if dr_cr == "C" else 0.0
+        ledger.append({
+            "voucher_date":    format_date(l.get("VoucherDt")),
+            "voucher_type":    safe_str(l.get("VoucherType")),
+            "voucher_no":      safe_str(l.get("VoucherNo")),
+            "debit":           debit,
+            "credit":          credit,
+            "narration":       safe_str(l.get("Narration1")),
+            "running_balance": safe_float(l.get("OverDue")),
+        })
+
+    # ── Collection Followup ──
+    followup = []
     for f in followup_rows:
-        followup_dict.setdefault(f["FnCode"], []).append(f)
-
-    # ══════════════════════════════════════
-    # BUILD EACH CONTRACT
-    # ══════════════════════════════════════
-
-    contracts_data = []
-
-    for c in contracts:
-        fn_code    = c["FnCode"]
-        fl_code    = safe_str(c.get("FlCode"))
-        outstanding = safe_float(c.get("FnAgAmtDue"))
-        seized      = safe_int(c.get("FnAgSeized"))
-        fn_settled  = safe_int(c.get("FnSettled"))
-
-        # ── Status: FnSettled=1 = Closed, FnAgSeized=1 = Seized, else Live ──
-        if fn_settled == 1:
-            status = "Closed"
-        elif seized == 1:
-            status = "Seized"
-        else:
-            status = "Live"
-
-        # ── Photo: A{FlCode}.jpg for both borrower and guarantor ──
-        photo_filename = f"A{fl_code}.jpg" if fl_code else None
-
-        # ── Payment Schedule ──
-        payment_schedule = []
-        for inst in inst_dict.get(fn_code, []):
-            payment_schedule.append({
-                "sno":              safe_int(inst.get("SerialNo")),
-                "emi_amount":       safe_float(inst.get("DueAmount")),
-                "due_date":         format_date(inst.get("DueDate")),
-                "payment_received": safe_float(inst.get("DueAmountRcvd")),
-                "date_received":    format_date(inst.get("DueRcvdOn")),
-                "delay_days":       safe_int(inst.get("DiffDays")),
-            })
-
-        # ── Ledger ──
-        ledger = []
-        for l in ledger_dict.get(fn_code, []):
-            # DrCrFlag: D = Debit, C = Credit
-            dr_cr   = safe_str(l.get("DrCrFlag")).upper()
-            amount  = safe_float(l.get("VoucherAmnt"))
-            debit   = amount if dr_cr == "D" else 0.0
-            credit  = amount if dr_cr == "C" else 0.0
-            ledger.append({
-                "voucher_date":    format_date(l.get("VoucherDt")),
-                "voucher_type":    safe_str(l.get("VoucherType")),
-                "voucher_no":      safe_str(l.get("VoucherNo")),
-                "debit":           debit,
-                "credit":          credit,
-                "narration":       safe_str(l.get("Narration1")),
-                "running_balance": safe_float(l.get("OverDue")),
-            })
-
-        # ── Collection Followup ──
-        followup = []
-        for f in followup_dict.get(fn_code, []):
-            # Combine all remarks into one string
-            remarks = " | ".join(
-                safe_str(f.get(f"Remark{str(i).zfill(2)}"))
-                for i in range(1, 11)
-                if safe_str(f.get(f"Remark{str(i).zfill(2)}"))
-            )
-            followup.append({
-                "serial":    safe_int(f.get("FnSerials")),
-                "run_date":  format_date(f.get("RunDate")),
-                "cont_date": format_date(f.get("ContDate")),
-                "remarks":   remarks,
-            })
-
-        # ── Customer name ──
-        customer_title = safe_str(c.get("Title"))
-        customer_name  = safe_str(c.get("FnName"))
-        full_name      = f"{customer_title} {customer_name}".strip() if customer_title else customer_name
-
-        # ── Guarantor name ──
-        g_title = safe_str(c.get("GTitle"))
-        g_name  = safe_str(c.get("GFather"))
-        g_full  = f"{g_title} {g_name}".strip() if g_title else g_name
-
-        # ── EMI amount ──
-        emi = safe_float(c.get("FnPayable"))
-        if emi == 0 and payment_schedule:
-            emi = payment_schedule[0]["emi_amount"]
-
-        # ── Build contract object ──
-        contract_obj = {
-            "_id":             str(fn_code),
-            "contract_number": safe_str(c.get("FnRefNo")) or str(fn_code),
-            "contract_date":   format_date(c.get("FnAgDate")),
-            "status":          status,
-            "customer_name":   full_name or customer_name,
-            "vehicle_number":  safe_str(c.get("FnRegistration")),
-            "file_number":     safe_str(c.get("FnRefNo")),
-            "fl_code":         fl_code,
-            "company_name":    safe_str(c.get("CoName")),
-            "company_alias":   safe_str(c.get("CoAlias")),
-            "article_name":    safe_str(c.get("AtName")),
-
-            # Photo filename — A{FlCode}.jpg (same for borrower & guarantor)
-            "photo":           photo_filename,
-
-            "customer": {
-                "name":    full_name or customer_name,
-                "father":  safe_str(c.get("Father")),
-                "phone":   safe_str(c.get("Mobile")),
-                "phone2":  safe_str(c.get("Mobile2")),
-                "phone3":  safe_str(c.get("Mobile3")),
-                "address": build_address(c, ""),
-                "photo":   photo_filename,
-            },
-
-            "guarantor": {
-                "name":     g_full,
-                "father":   safe_str(c.get("GFather")),
-                "phone":    safe_str(c.get("GMobile")),
-                "phone2":   safe_str(c.get("GMobile2")),
-                "phone3":   safe_str(c.get("GMobile3")),
-                "address":  build_address(c, "G"),
-                "relation": "Guarantor",
-                "photo":    photo_filename,
-            },
-
-            "vehicle": {
-                "make":                safe_str(c.get("AtName")),
-                "model":               safe_str(c.get("FnModel")),
-                "year":                0,
-                "registration_number": safe_str(c.get("FnRegistration")),
-                "chassis_number":      safe_str(c.get("FnChassis")),
-                "engine_number":       safe_str(c.get("FnEngine")),
-                "color":               safe_str(c.get("FnColour")),
-            },
-
-            "loan": {
-                "loan_amount":        safe_float(c.get("LoanAmount")),
-                "interest_rate":      safe_float(c.get("FnFinRate")),
-                "tenure_months":      len(payment_schedule),
-                "emi_amount":         emi,
-                "total_amount":       safe_float(c.get("TotalAmount")),
-                "amount_paid":        safe_float(c.get("FnAgAmtPaid")),
-                "outstanding_amount": outstanding,
-            },
-
-            "payment_schedule": payment_schedule,
-            "ledger":           ledger,
-            "followup":         followup,
-        }
-
-        contracts_data.append(contract_obj)
+        # Combine all remarks into one string
+        remarks = " | ".join(
+            safe_str(f.get(f"Remark{str(i).zfill(2)}"))
+            for i in range(1, 11)
+            if safe_str(f.get(f"Remark{str(i).zfill(2)}"))
+        )
+        followup.append({
+            "serial":    safe_int(f.get("FnSerials")),
+            "run_date":  format_date(f.get("RunDate")),
+            "cont_date": format_date(f.get("ContDate")),
+            "remarks":   remarks,
+        })
+
+    # ── Customer name ──
+    customer_title = safe_str(c.get("Title"))
+    customer_name  = safe_str(c.get("FnName"))
+    full_name      = f"{customer_title} {customer_name}".strip() if customer_title else customer_name
+
+    # ── Guarantor name ──
+    g_title = safe_str(c.get("GTitle"))
+    g_name  = safe_str(c.get("GFather"))
+    g_full  = f"{g_title} {g_name}".strip() if g_title else g_name
+
+    # ── EMI amount ──
+    emi = safe_float(c.get("FnPayable"))
+    if emi == 0 and payment_schedule:
+        emi = payment_schedule[0]["emi_amount"]
+
+    # ── Build contract object ──
+    contract_obj = {
+        "_id":             str(fn_code),
+        "contract_number": safe_str(c.get("FnRefNo")) or str(fn_code),
+        "contract_date":   format_date(c.get("FnAgDate")),
+        "status":          status,
+        "customer_name":   full_name or customer_name,
+        "vehicle_number":  safe_str(c.get("FnRegistration")),
+        "file_number":     safe_str(c.get("FnRefNo")),
+        "fl_code":         fl_code,
+        "company_name":    safe_str(c.get("CoName")),
+        "company_alias":   safe_str(c.get("CoAlias")),
+        "article_name":    safe_str(c.get("AtName")),
+
+        # Photo filename — A{FlCode}.jpg (same for borrower & guarantor)
+        "photo":           photo_filename,
+
+        "customer": {
+            "name":    full_name or customer_name,
+            "father":  safe_str(c.get("Father")),
+            "phone":   safe_str(c.get("Mobile")),
+            "phone2":  safe_str(c.get("Mobile2")),
+            "phone3":  safe_str(c.get("Mobile3")),
+            "address": build_address(c, ""),
+            "photo":   photo_filename,
+        },
+
+        "guarantor": {
+            "name":     g_full,
+            "father":   safe_str(c.get("GFather")),
+            "phone":    safe_str(c.get("GMobile")),
+            "phone2":   safe_str(c.get("GMobile2")),
+            "phone3":   safe_str(c.get("GMobile3")),
+            "address":  build_address(c, "G"),
+            "relation": "Guarantor",
+            "photo":    photo_filename,
+        },
+
+        "vehicle": {
+            "make":                safe_str(c.get("AtName")),
+            "model":               safe_str(c.get("FnModel")),
+            "year":                0,
+            "registration_number": safe_str(c.get("FnRegistration")),
+            "chassis_number":      safe_str(c.get("FnChassis")),
+            "engine_number":       safe_str(c.get("FnEngine")),
+            "color":               safe_str(c.get("FnColour")),
+        },
+
+        "loan": {
+            "loan_amount":        safe_float(c.get("LoanAmount")),
+            "interest_rate":      safe_float(c.get("FnFinRate")),
+            "tenure_months":      len(payment_schedule),
+            "emi_amount":         emi,
+            "total_amount":       safe_float(c.get("TotalAmount")),
+            "amount_paid":        safe_float(c.get("FnAgAmtPaid")),
+            "outstanding_amount": outstanding,
+        },
+
+        "payment_schedule": payment_schedule,
+        "ledger":           ledger,
+        "followup":         followup,
+    }
+
+    return contract_obj
+
+
+def iter_contracts(conn, fn_codes=None, arraysize=DEFAULT_ARRAYSIZE):
+    """Yield contracts one at a time by merge-joining the four source
+    queries on FnCode. Every query is ordered by FnCode, so only one
+    contract's rows are ever held in memory."""
+    def stream(name):
+        return iter_query(conn, *source_query(name, fn_codes), arraysize=arraysize)
+
+    installments = ChildRows(stream("installments"), "installments")
+    ledger       = ChildRows(stream("ledger"), "ledger")
+    followup     = ChildRows(stream("followup"), "followup")
+
+    for c in stream("contracts"):
+        fn_code = c["FnCode"]
+        yield build_contract(
+            c,
+            installments.take(fn_code),
+            ledger.take(fn_code),
+            followup.take(fn_code),
+        )
 
+
+def build_contract_data(conn, fn_codes=None, arraysize=DEFAULT_ARRAYSIZE):
+    """Build every contract, or only those in fn_codes for incremental runs"""
+    print("  Fetching contracts, instalments, ledger and followup...")
+    contracts_data = list(iter_contracts(conn, fn_codes, arraysize))
+    print(f"    → {len(contracts_data)} contracts built")
     return contracts_data
 
 
+# ══════════════════════════════════════
+# PARALLEL EXTRACTION
+# ══════════════════════════════════════
+# Each source query runs on its own pooled connection in a worker thread
+# and hands rows to the merge-join through a queue, so total extract time
+# approaches the slowest query instead of the sum of all four.
+
+QUEUE_DEPTH = 8   # fetchmany batches buffered per query
+_DONE = object()
+
+class ConnectionPool:
+    """A fixed set of connections handed out one thread at a time"""
+
+    def __init__(self, config, size):
+        self._idle = queue.Queue()
+        self._all  = []
+        for _ in range(size):
+            conn = connect_to_database(config)
+            if conn is None:
+                self.close()
+                raise RuntimeError("Could not open pooled connection")
+            self._all.append(conn)
+            self._idle.put(conn)
+
+    def acquire(self):
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def close(self):
+        for conn in self._all:
+            conn.close()
+        self._all = []
+
+def _put(out, item, stop):
+    """queue.put that gives up once the consumer has stopped"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+def _produce(pool, name, fn_codes, arraysize, out, stop, timings):
+    conn = pool.acquire()
+    started = time.perf_counter()
+    try:
+        cursor = conn.cursor()
+        cursor.arraysize = arraysize
+        cursor.execute(*source_query(name, fn_codes))
+        columns = [col[0] for col in cursor.description]
+        timing = {"execute_s": time.perf_counter() - started, "rows": 0}
+        while not stop.is_set():
+            rows = cursor.fetchmany(arraysize)
+            if not rows:
+                break
+            timing["rows"] += len(rows)
+            _put(out, [dict(zip(columns, row)) for row in rows], stop)
+        cursor.close()
+        timing["total_s"] = time.perf_counter() - started
+        timings[name] = timing
+        _put(out, _DONE, stop)
+    except Exception as e:
+        _put(out, e, stop)
+    finally:
+        pool.release(conn)
+
+def _consume(out):
+    while True:
+        item = out.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield from item
+
+def iter_contracts_parallel(pool, fn_codes=None, arraysize=DEFAULT_ARRAYSIZE):
+    """iter_contracts with every source query on its own pooled connection.
+
+    The merge-join reads all four queries at once, so every query needs a
+    worker and a connection of its own; with fewer, a bounded queue would
+    deadlock and an unbounded one would buffer whole tables.
+    """
+    names   = list(SOURCE_QUERIES)
+    queues  = {name: queue.Queue(maxsize=QUEUE_DEPTH) for name in names}
+    stop    = threading.Event()
+    timings = {}
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        for name in names:
+            executor.submit(_produce, pool, name, fn_codes, arraysize, queues[name], stop, timings)
+        try:
+            installments = ChildRows(_consume(queues["installments"]), "installments")
+            ledger       = ChildRows(_consume(queues["ledger"]), "ledger")
+            followup     = ChildRows(_consume(queues["followup"]), "followup")
+
+            for c in _consume(queues["contracts"]):
+                fn_code = c["FnCode"]
+                yield build_contract(
+                    c,
+                    installments.take(fn_code),
+                    ledger.take(fn_code),
+                    followup.take(fn_code),
+                )
+        finally:
+            stop.set()
+
+    print(f"\n  Extract timings ({len(names)} connections):")
+    for name in names:
+        t = timings.get(name)
+        if t:
+            print(f"    {name:<13} {t['rows']:>9} rows  execute {t['execute_s']:.2f}s  total {t['total_s']:.2f}s")
+    print(f"    {'wall clock':<13} {time.perf_counter() - started:.2f}s")
+
+
 # ══════════════════════════════════════
 # SAVE OUTPUT
 # ══════════════════════════════════════
 
-def save_output(data, filename="app_data.json"):
-    wrapped = {"contracts": data}
+def write_contracts(f, contracts, compact=False):
+    """Write contracts as the body of a JSON array, one at a time.
+
+    Indented output matches json.dump(..., indent=2) of the array nested
+    one level inside an object. Returns the number written.
+    """
+    count = 0
+    for contract in contracts:
+        if compact:
+            f.write("," if count else "")
+            f.write(json.dumps(contract, ensure_ascii=False, separators=(",", ":")))
+        else:
+            f.write(",\n" if count else "\n")
+            f.write(textwrap.indent(json.dumps(contract, indent=2, ensure_ascii=False), "    "))
+        count += 1
+    if count and not compact:
+        f.write("\n  ")
+    return count
+
+def save_output(data, filename="app_data.json", compact=False):
+    """Stream contracts (any iterable) to filename as {"contracts": [...]}"""
+    # Written to a temp file first so a failure never leaves half a file
+    with open(filename + ".tmp", "w", encoding="utf-8") as f:
+        f.write('{"contracts":[' if compact else '{\n  "contracts": [')
+        count = write_contracts(f, data, compact)
+        f.write("]}" if compact else "]\n}")
+    os.replace(filename + ".tmp", filename)
+    print(f"\n  Saved: {filename}")
+    print(f"  Total Contracts: {count}")
+    return count
+
+
+# ══════════════════════════════════════
+# INCREMENTAL SYNC
+# ══════════════════════════════════════
+# SQL Server hashes every source row per FnCode; only contracts whose
+# hashes moved since the last run are re-exported. Each row is hashed as
+# its full JSON, so text/image columns count too, and rows are sorted
+# before hashing so the result does not depend on scan order. Hashing
+# scans all four tables, so it only runs for --incremental and
+# --record-state.
+
+SYNC_STATE_FILE = "sync_state.json"
+DELTA_FILE      = "app_data_delta.json"
+# Stored with the hashes; state written by another scheme forces a full export
+HASH_SCHEME     = "sha2_256-json-v1"
+
+def table_checksums(conn):
+    """{table: {FnCode: hex digest}} for every source query"""
+    checksums = {}
+    for name, (query, _, _) in SOURCE_QUERIES.items():
+        rows = execute_query(conn, f"""
+            SELECT r.FnCode,
+                   CONVERT(char(64), HASHBYTES('SHA2_256',
+                       STRING_AGG(r.RowJson, N'|') WITHIN GROUP (ORDER BY r.RowJson)), 2) AS Chk
+            FROM (
+                SELECT q.FnCode, j.RowJson
+                FROM ({query.format(scope="")}) AS q
+                CROSS APPLY (SELECT (SELECT q.* FOR JSON PATH, WITHOUT_ARRAY_WRAPPER, INCLUDE_NULL_VALUES)
+                             AS RowJson) AS j
+            ) AS r
+            GROUP BY r.FnCode
+        """)
+        checksums[name] = {str(r["FnCode"]): r["Chk"] for r in rows}
+        print(f"    → {name}: {len(rows)} contracts hashed")
+    return checksums
+
+def changed_fn_codes(old, new):
+    """FnCodes to re-export and FnCodes that no longer exist"""
+    live    = set(new.get("contracts", {}))
+    changed = set()
+    for name, sums in new.items():
+        previous = old.get(name, {})
+        changed.update(code for code, chk in sums.items() if previous.get(code) != chk)
+        # Child rows removed entirely also change the contract
+        changed.update(code for code in previous if code not in sums)
+    deleted = set(old.get("contracts", {})) - live
+    return sorted(changed & live), sorted(deleted)
+
+def load_sync_state(filename=SYNC_STATE_FILE):
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    # Hashes from an older scheme never match, so treat them as no state
+    return state if state.get("scheme") == HASH_SCHEME else None
+
+def save_sync_state(checksums, filename=SYNC_STATE_FILE):
+    state = {"last_run": datetime.now().isoformat(timespec="seconds"), "scheme": HASH_SCHEME,
+             "checksums": checksums}
     with open(filename, "w", encoding="utf-8") as f:
-        json.dump(wrapped, f, indent=2, ensure_ascii=False)
+        json.dump(state, f)
+
+def save_delta(data, deleted, since, filename=DELTA_FILE, compact=False):
+    """Write changed contracts plus deleted ids for POST /api/import-data/delta"""
+    with open(filename + ".tmp", "w", encoding="utf-8") as f:
+        if compact:
+            f.write(json.dumps({"since": since, "deleted": deleted}, separators=(",", ":"))[:-1])
+            f.write(',"contracts":[')
+        else:
+            f.write("{\n")
+            f.write(f'  "since": {json.dumps(since)},\n')
+            f.write(f'  "deleted": {json.dumps(deleted)},\n')
+            f.write('  "contracts": [')
+        count = write_contracts(f, data, compact)
+        f.write("]}" if compact else "]\n}")
+    os.replace(filename + ".tmp", filename)
     print(f"\n  Saved: {filename}")
-    print(f"  Total Contracts: {len(data)}")
+    print(f"  Changed Contracts: {count}")
+    print(f"  Deleted Contracts: {len(deleted)}")
+
+def run_incremental(conn, extract, compact=False):
+    """extract(fn_codes) yields built contracts, fn_codes=None for all"""
+    state = load_sync_state()
+    print("  Hashing source rows...")
+    checksums = table_checksums(conn)
+
+    if state is None:
+        print("  No previous sync state, running full export")
+        save_output(extract(None), compact=compact)
+    else:
+        changed, deleted = changed_fn_codes(state["checksums"], checksums)
+        print(f"  {len(changed)} changed, {len(deleted)} deleted since {state['last_run']}")
+        data = extract(changed) if changed else []
+        save_delta(data, deleted, state["last_run"], compact=compact)
+
+    # Only remember the new checksums once the output is safely written
+    save_sync_state(checksums)
+
+
+# ══════════════════════════════════════
+# PHOTOS
+# ══════════════════════════════════════
+
+def collect_photos(contracts, names):
+    """Pass contracts through, remembering every photo filename they use"""
+    for contract in contracts:
+        if contract.get("photo"):
+            names.add(contract["photo"])
+        yield contract
+
+def run_photo_pipeline(names, photo_dir, out_dir):
+    print(f"\nProcessing {len(names)} photos from {photo_dir}...")
+    stats, _ = process_photos([os.path.join(photo_dir, n) for n in names], out_dir)
+    print(f"  Rendered: {stats['rendered']}  Cached: {stats['cached']}  "
+          f"Missing: {stats['missing']}  Failed: {stats['failed']}")
+    print(f"  Thumbnails and previews in: {out_dir}")
 
 
 # ══════════════════════════════════════
 # MAIN
 # ══════════════════════════════════════
 
+def arg_value(name, default):
+    """Value following name on the command line, e.g. --parallel 4"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
 def main():
     if not PYODBC_AVAILABLE:
         print("pyodbc not installed. Run: py -m pip install pyodbc")
@@ -388,16 +751,52 @@ def main():
         return
     print("Connected!\n")
 
+    # --compact drops indentation, roughly halving the output size
+    compact     = "--compact" in sys.argv
+    # --parallel runs each source query on its own connection; any value
+    # above 1 means one connection per query, the only parallel layout the
+    # merge-join can stream without buffering
+    parallelism = len(SOURCE_QUERIES) if safe_int(arg_value("--parallel", 1), 1) > 1 else 1
+    arraysize   = max(1, safe_int(arg_value("--arraysize", DEFAULT_ARRAYSIZE), DEFAULT_ARRAYSIZE))
+    # --photos DIR makes thumbnails/previews of every A{FlCode}.jpg used
+    photo_dir   = arg_value("--photos", None)
+    photo_out   = arg_value("--photo-out", "photos")
+    photo_names = set()
+    pool        = None
+
     try:
+        if parallelism > 1:
+            pool = ConnectionPool(config, parallelism)
+
+        def extract(fn_codes=None):
+            if pool:
+                contracts = iter_contracts_parallel(pool, fn_codes, arraysize)
+            else:
+                contracts = iter_contracts(conn, fn_codes, arraysize)
+            return collect_photos(contracts, photo_names)
+
         print("Fetching data...")
-        data = build_contract_data(conn)
-        print("\nSaving output...")
-        save_output(data)
+        if "--incremental" in sys.argv:
+            run_incremental(conn, extract, compact)
+        else:
+            # --record-state hashes the source first so a later
+            # --incremental run has a baseline; plain exports skip it
+            checksums = table_checksums(conn) if "--record-state" in sys.argv else None
+            # Contracts are written as they are built, never all held at once
+            print("Building and saving contracts...")
+            save_output(extract(), compact=compact)
+            if checksums is not None:
+                save_sync_state(checksums)
+
+        if photo_dir:
+            run_photo_pipeline(photo_names, photo_dir, photo_out)
 
     except Exception as e:
         print("\nError:", e)
         traceback.print_exc()
     finally:
+        if pool:
+            pool.close()
         conn.close()
 
     print("\n====================================")
@@ -407,4 +806,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Needed for the photo process pool inside the PyInstaller EXE
+    multiprocessing.freeze_support()
     main()